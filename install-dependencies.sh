@@ -59,6 +59,7 @@ fedora_packages=(
     python3-pyudev
     python3-setuptools
     python3-urwid
+    python3-numpy
     python3-pyparsing
     python3-requests
     python3-pyudev
@@ -32,5 +32,5 @@ PYVER=$(python3 -V | cut -d' ' -f2)
 echo "$PYVER" > build/python3/SCYLLA-VERSION-FILE
 ln -fv build/SCYLLA-RELEASE-FILE build/python3/SCYLLA-RELEASE-FILE
 
-PACKAGES="python3-pyyaml python3-urwid python3-pyparsing python3-requests python3-pyudev python3-setuptools python3-psutil python3-cassandra-driver"
+PACKAGES="python3-pyyaml python3-urwid python3-numpy python3-pyparsing python3-requests python3-pyudev python3-setuptools python3-psutil python3-cassandra-driver"
 ./scripts/create-relocatable-package-python3.py --output "$TARGET" $PACKAGES
@@ -15,6 +15,15 @@ import bisect
 import os
 import subprocess
 import time
+import array
+import json
+import mmap
+
+try:
+    import numpy
+except ImportError:
+    # gdb's embedded Python may not have NumPy, the bulk decoders fall back to struct
+    numpy = None
 
 
 def template_arguments(gdb_type):
@@ -745,7 +754,7 @@ class scylla_task_histogram(gdb.Command):
                 help="Show only the top COUNT elements of the histogram. Defaults to 30. Set to 0 to show all items. Ignored when `--all` is used.")
         parser.add_argument("-a", "--all", action="store_true", default=False,
                 help="Sample all pages and show all results. Equivalent to -m=0 -c=0.")
-        parser.add_argument("-s", "--size", action="store", default=0,
+        parser.add_argument("-s", "--size", action="store", type=int, default=0,
                 help="The size of objects to sample. When set, only objects of this size will be sampled. A size of 0 (the default value) means no size restrictions.")
         try:
             args = parser.parse_args(arg.split())
@@ -753,76 +762,114 @@ class scylla_task_histogram(gdb.Command):
             return
 
         size = args.size
-        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-        page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-        mem_start = cpu_mem['memory']
+        table = page_table.current()
+        page_size = table.page_size
 
-        vptr_type = gdb.lookup_type('uintptr_t').pointer()
+        # visiting the spans in random order samples the same way visiting random pages did
+        small_spans = [span for span in table.spans() if span.is_small()]
+        if not args.all:
+            random.shuffle(small_spans)
 
-        pages = cpu_mem['pages']
-        nr_pages = int(cpu_mem['nr_pages'])
-        page_samples = range(0, nr_pages) if args.all else random.sample(range(0, nr_pages), nr_pages)
+        text_range = get_text_range()
 
-        text_start, text_end = get_text_range()
-
-        sc = span_checker()
+        object_size = small_pool_object_sizes()
         vptr_count = defaultdict(int)
         scanned_pages = 0
-        for idx in page_samples:
-            span = sc.get_span(mem_start + idx * page_size)
-            if not span or span.index != idx or not span.is_small():
-                continue
-            pool = span.pool()
-            if int(pool.dereference()['_object_size']) != size and size != 0:
+        for span in small_spans:
+            objsize = object_size(span)
+            if objsize != size and size != 0:
                 continue
             scanned_pages += 1
-            objsize = size if size != 0 else int(pool.dereference()['_object_size'])
-            span_size = span.used_span_size() * page_size
-            for idx2 in range(0, int(span_size / objsize)):
-                obj_addr = span.start + idx2 * objsize
-                addr = gdb.Value(obj_addr).reinterpret_cast(vptr_type).dereference()
-                if addr >= text_start and addr <= text_end:
-                    vptr_count[int(addr)] += 1
+            _, vptrs = span_vptrs(span.start, span.used_span_size() * page_size, objsize, text_range)
+            for vptr in vptrs:
+                vptr_count[vptr] += 1
             if (not args.all or args.samples > 0) and (scanned_pages >= args.samples or len(vptr_count) >= args.samples):
                 break
 
         sorted_counts = sorted(vptr_count.items(), key=lambda e: -e[1])
         to_show = sorted_counts if args.all or args.count == 0 else sorted_counts[:args.count]
+        symbols = resolve_many(vptr for vptr, _ in to_show)
         for vptr, count in to_show:
-            sym = resolve(vptr)
+            sym = symbols[vptr]
             if sym:
                 gdb.write('%10d: 0x%x %s\n' % (count, vptr, sym))
 
 
+def small_pool_object_sizes():
+    """
+    Returns a callable mapping a span's small_pool address to its object size,
+    looking each pool up through gdb only once.
+    """
+    sizes = {}
+
+    def object_size(span):
+        pool = span.pool_address()
+        if pool not in sizes:
+            sizes[pool] = int(span.pool().dereference()['_object_size'])
+        return sizes[pool]
+
+    return object_size
+
+
+def span_vptrs(start, span_size, object_size, text_range):
+    """
+    Scans the objects of a small-object span for ones starting with a vptr.
+
+    The span is fetched with a single read_memory() and the first word of
+    every object is compared against the .rodata range in one go (with numpy
+    when available).
+
+    :param start: the address of the span.
+    :param span_size: the size of the span, in bytes.
+    :param object_size: the size of the span's objects.
+    :param text_range: (start, end) of the .rodata section, see get_text_range().
+
+    :returns: a pair of lists: the addresses of the objects which start with
+        a vptr and the vptrs themselves, both ints. Spans which can't be read
+        (e.g. missing from the core) yield nothing.
+    """
+    count = span_size // object_size
+    if count == 0 or object_size < 8:
+        return [], []
+    try:
+        buf = gdb.selected_inferior().read_memory(start, (count - 1) * object_size + 8)
+    except gdb.MemoryError:
+        return [], []
+    text_start, text_end = text_range
+    if numpy is not None:
+        words = numpy.ndarray(shape=(count,), dtype='<u8', buffer=buf, strides=(object_size,))
+        found = numpy.flatnonzero((words >= text_start) & (words <= text_end))
+        return (start + found * object_size).tolist(), words[found].tolist()
+    if object_size % 8 == 0:
+        words = memoryview(buf).cast('B').cast('Q')[::object_size // 8]
+    else:
+        words = [struct.unpack_from('<Q', buf, i * object_size)[0] for i in range(count)]
+    objects = []
+    vptrs = []
+    for i, word in enumerate(words):
+        if text_start <= word <= text_end:
+            objects.append(start + i * object_size)
+            vptrs.append(word)
+    return objects, vptrs
+
+
 def find_vptrs():
-    cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-    page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-    mem_start = cpu_mem['memory']
-    vptr_type = gdb.lookup_type('uintptr_t').pointer()
-    pages = cpu_mem['pages']
-    nr_pages = int(cpu_mem['nr_pages'])
-
-    text_start, text_end = get_text_range()
-    def is_vptr(addr):
-        return addr >= text_start and addr <= text_end
-
-    idx = 0
-    while idx < nr_pages:
-        if pages[idx]['free']:
-            idx += pages[idx]['span_size']
-            continue
-        pool = pages[idx]['pool']
-        if not pool or pages[idx]['offset_in_span'] != 0:
-            idx += 1
+    """
+    Yields (object, vptr) for every object in a small-object span which
+    starts with a vptr. object is a char* gdb.Value, vptr an int.
+    """
+    table = page_table.current()
+    page_size = table.page_size
+    char_ptr = gdb.lookup_type('char').pointer()
+    object_size = small_pool_object_sizes()
+    text_range = get_text_range()
+
+    for span in table.spans():
+        if not span.is_small() or table.offset_in_span[span.index] != 0:
             continue
-        objsize = int(pool.dereference()['_object_size'])
-        span_size = pages[idx]['span_size'] * page_size
-        for idx2 in range(0, int(span_size / objsize) + 1):
-            obj_addr = mem_start + idx * page_size + idx2 * objsize
-            vptr = obj_addr.reinterpret_cast(vptr_type).dereference()
-            if is_vptr(vptr):
-                yield obj_addr, vptr
-        idx += pages[idx]['span_size']
+        objects, vptrs = span_vptrs(span.start, span.size() * page_size, object_size(span), text_range)
+        for obj_addr, vptr in zip(objects, vptrs):
+            yield gdb.Value(obj_addr).cast(char_ptr), vptr
 
 
 def find_single_sstable_readers():
@@ -835,8 +882,10 @@ def find_single_sstable_readers():
         ptr_type = gdb.lookup_type('sstables::sstable_mutation_reader').pointer()
         vtable_name = 'vtable for sstables::sstable_mutation_reader'
 
-    for obj_addr, vtable_addr in find_vptrs():
-        name = resolve(vtable_addr)
+    found = list(find_vptrs())
+    symbols = resolve_many(vtable_addr for _, vtable_addr in found)
+    for obj_addr, vtable_addr in found:
+        name = symbols[vtable_addr]
         if name and name.startswith(vtable_name):
             yield obj_addr.reinterpret_cast(ptr_type)
 
@@ -979,45 +1028,211 @@ def find_instances(type_name):
     """
     ptr_type = gdb.lookup_type(type_name).pointer()
     vtable_name = 'vtable for %s ' % type_name
-    for obj_addr, vtable_addr in find_vptrs():
-        name = resolve(vtable_addr)
+    found = list(find_vptrs())
+    symbols = resolve_many(vtable_addr for _, vtable_addr in found)
+    for obj_addr, vtable_addr in found:
+        name = symbols[vtable_addr]
         if name and name.startswith(vtable_name):
             yield gdb.Value(obj_addr).cast(ptr_type)
 
 
+class field_layout(object):
+    """
+    Position of a (possibly bit-) field inside a struct, looked up from the debug info.
+    """
+
+    _codes = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+    def __init__(self, gdb_type, name):
+        for field in gdb_type.fields():
+            if field.name == name:
+                break
+        else:
+            raise ValueError("{} has no field {}".format(gdb_type, name))
+        if field.bitsize:
+            self.offset = field.bitpos // 8
+            self.shift = field.bitpos % 8
+            self.mask = (1 << field.bitsize) - 1
+            self.size = (self.shift + field.bitsize + 7) // 8
+            # round up to something struct and NumPy can load directly
+            self.size = min(size for size in self._codes if size >= self.size)
+        else:
+            self.offset = field.bitpos // 8
+            self.shift = 0
+            self.mask = None
+            self.size = field.type.strip_typedefs().sizeof
+
+    def decode(self, buf, record_size, count):
+        """
+        Extract this field from `count` consecutive records of `record_size` bytes.
+        Returns a NumPy array, or a list when NumPy is not available.
+        """
+        if numpy is not None:
+            raw = numpy.frombuffer(buf, dtype=numpy.uint8, count=count * record_size).reshape(count, record_size)
+            column = numpy.ascontiguousarray(raw[:, self.offset:self.offset + self.size]).view('<u%d' % self.size).ravel()
+            if self.mask is not None:
+                column = (column >> self.shift) & self.mask
+            return column
+        record = struct.Struct('<%dx%s%dx' % (self.offset, self._codes[self.size], record_size - self.offset - self.size))
+        column = [value for value, in struct.iter_unpack(record.format, bytes(memoryview(buf)[:count * record_size]))]
+        if self.mask is not None:
+            column = [(value >> self.shift) & self.mask for value in column]
+        return column
+
+
+class page_table(object):
+    """
+    Snapshot of the current shard's seastar::memory::cpu_mem.pages.
+
+    The table is fetched with a few large read_memory() calls and the fields
+    the span walkers need are decoded in bulk, instead of evaluating
+    `pages[idx]` through gdb for every page. Snapshots are cached per thread
+    until the inferior runs again.
+    """
+
+    _fields = ('free', 'offset_in_span', 'span_size', 'pool', 'freelist')
+    # pages per read_memory(), so that a hole in a truncated core only costs per-page reads of one chunk
+    _chunk_pages = 65536
+    _layouts = {}
+    _cache = {}
+
+    def __init__(self):
+        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
+        self.page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+        self.nr_pages = int(cpu_mem['nr_pages'])
+        self.memory_start = int(cpu_mem['memory'])
+        self.pages = cpu_mem['pages']
+        page_type = self.pages.type.target().strip_typedefs()
+        self.record_size = page_type.sizeof
+        self.pool_type = page_type['pool'].type
+        layout = self._layout(page_type)
+        buf = self._read(int(self.pages))
+        self.columns = dict((name, layout[name].decode(buf, self.record_size, self.nr_pages)) for name in self._fields)
+        # plain lists for the sequential walks, indexing NumPy arrays one element at a time is slow
+        if numpy is not None:
+            self.free, self.offset_in_span, self.span_size, self.pool, self.freelist = (self.columns[name].tolist() for name in self._fields)
+        else:
+            self.free, self.offset_in_span, self.span_size, self.pool, self.freelist = (self.columns[name] for name in self._fields)
+        self._spans = None
+
+    def _read(self, address):
+        """
+        The raw page records. Records missing from the core are left zeroed, which reads as
+        pages that are neither free nor a span head.
+        """
+        inferior = gdb.selected_inferior()
+        record_size = self.record_size
+        buf = bytearray(self.nr_pages * record_size)
+        for first in range(0, self.nr_pages, self._chunk_pages):
+            count = min(self._chunk_pages, self.nr_pages - first)
+            offset = first * record_size
+            try:
+                buf[offset:offset + count * record_size] = inferior.read_memory(address + offset, count * record_size)
+                continue
+            except gdb.MemoryError:
+                pass
+            missing = 0
+            for idx in range(first, first + count):
+                offset = idx * record_size
+                try:
+                    buf[offset:offset + record_size] = inferior.read_memory(address + offset, record_size)
+                except gdb.MemoryError:
+                    missing += 1
+            gdb.write('page table: {} of pages {}-{} are not in the core\n'.format(missing, first, first + count - 1))
+        return buf
+
+    @classmethod
+    def _layout(cls, page_type):
+        key = str(page_type)
+        if key not in cls._layouts:
+            cls._layouts[key] = dict((name, field_layout(page_type, name)) for name in cls._fields)
+        return cls._layouts[key]
+
+    @classmethod
+    def current(cls):
+        """
+        The snapshot of the selected thread's shard, reused until the inferior is resumed.
+        """
+        thread = gdb.selected_thread()
+        key = (gdb.selected_inferior().num, thread.global_num if thread else None)
+        if key not in cls._cache:
+            cls._cache[key] = page_table()
+        return cls._cache[key]
+
+    @classmethod
+    def invalidate(cls, *_):
+        cls._cache.clear()
+
+    def page(self, index):
+        return self.pages[index]
+
+    def page_address(self, index):
+        return self.memory_start + index * self.page_size
+
+    def spans(self):
+        """
+        All spans of the shard, ordered by address. Walks the span heads only.
+        """
+        if self._spans is None:
+            result = []
+            span_size = self.span_size
+            idx = 1
+            while idx < self.nr_pages:
+                size = span_size[idx]
+                if size == 0:
+                    idx += 1
+                    continue
+                result.append(span(idx, self.page_address(idx), table=self))
+                idx += size
+            self._spans = result
+        return self._spans
+
+
 class span(object):
     """
     Represents seastar allocator's memory span
     """
 
-    def __init__(self, index, start, page):
+    def __init__(self, index, start, page=None, table=None):
         """
         :param index: index into cpu_mem.pages of the first page of the span
         :param start: memory address of the first page of the span
-        :param page: seastar::memory::page* for the first page of the span
+        :param page: seastar::memory::page* for the first page of the span,
+            looked up lazily from table when not given
+        :param table: the page_table snapshot the span was found in
         """
         self.index = index
         self.start = start
-        self.page = page
+        self._page = page
+        self._table = table if table is not None else page_table.current()
+
+    @property
+    def page(self):
+        if self._page is None:
+            self._page = self._table.page(self.index)
+        return self._page
 
     def is_free(self):
-        return self.page['free']
+        return bool(self._table.free[self.index])
+
+    def pool_address(self):
+        return self._table.pool[self.index]
 
     def pool(self):
         """
         Returns seastar::memory::small_pool* of this span.
         Valid only when is_small().
         """
-        return self.page['pool']
+        return gdb.Value(self.pool_address()).cast(self._table.pool_type)
 
     def is_small(self):
-        return not self.is_free() and self.page['pool']
+        return not self.is_free() and self.pool_address() != 0
 
     def is_large(self):
-        return not self.is_free() and not self.page['pool']
+        return not self.is_free() and self.pool_address() == 0
 
     def size(self):
-        return int(self.page['span_size'])
+        return self._table.span_size[self.index]
 
     def used_span_size(self):
         """
@@ -1029,43 +1244,30 @@ class span(object):
 
         Returns 0 for free spans.
         """
-        n_pages = 0
-        pool = self.page['pool']
-        if self.page['free']:
+        if self.is_free():
             return 0
+        pool = self.pool_address()
         if not pool:
-            return self.page['span_size']
-        for idx in range(int(self.page['span_size'])):
-            page = self.page.address + idx
-            if not page['pool'] or page['pool'] != pool or page['offset_in_span'] != idx:
+            return self.size()
+        table = self._table
+        n_pages = 0
+        for idx in range(self.size()):
+            page = self.index + idx
+            if table.pool[page] != pool or table.offset_in_span[page] != idx:
                 break
             n_pages += 1
         return n_pages
 
 
 def spans():
-    cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-    page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-    nr_pages = int(cpu_mem['nr_pages'])
-    pages = cpu_mem['pages']
-    mem_start = int(cpu_mem['memory'])
-    idx = 1
-    while idx < nr_pages:
-        page = pages[idx]
-        span_size = int(page['span_size'])
-        if span_size == 0:
-            idx += 1
-            continue
-        last_page = pages[idx + span_size - 1]
-        addr = mem_start + idx * page_size
-        yield span(idx, addr, page)
-        idx += span_size
+    return iter(page_table.current().spans())
 
 
 class span_checker(object):
     def __init__(self):
-        self._page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-        span_list = list(spans())
+        self._table = page_table.current()
+        self._page_size = self._table.page_size
+        span_list = self._table.spans()
         self._start_to_span = dict((s.start, s) for s in span_list)
         self._starts = list(s.start for s in span_list)
 
@@ -1078,7 +1280,7 @@ class span_checker(object):
             return None
         span_start = self._starts[idx - 1]
         s = self._start_to_span[span_start]
-        if span_start + s.page['span_size'] * self._page_size <= ptr:
+        if span_start + s.size() * self._page_size <= ptr:
             return None
         return s
 
@@ -1262,6 +1464,10 @@ class scylla_memory(gdb.Command):
                           unused='unused', wasted_percent='wst%'))
         total_small_bytes = 0
         sc = span_checker()
+        spans_by_pool = defaultdict(list)
+        for s in sc.spans():
+            if s.is_small():
+                spans_by_pool[s.pool_address()].append(s)
         for i in range(int(nr)):
             sp = small_pools['_u']['a'][i]
             object_size = int(sp['_object_size'])
@@ -1269,10 +1475,9 @@ class scylla_memory(gdb.Command):
             free_count = int(sp['_free_count'])
             pages_in_use = 0
             use_count = 0
-            for s in sc.spans():
-                if s.pool() == sp.address:
-                    pages_in_use += s.size()
-                    use_count += int(s.used_span_size() * page_size / object_size)
+            for s in spans_by_pool[int(sp.address)]:
+                pages_in_use += s.size()
+                use_count += int(s.used_span_size() * page_size / object_size)
             memory = pages_in_use * page_size
             total_small_bytes += memory
             use_count -= free_count
@@ -1513,6 +1718,21 @@ def get_seastar_memory_start_and_size():
     return start, total_mem
 
 
+def lsa_segment_pool():
+    """
+    Returns the shard's logalloc::shard_segment_pool, the address of its
+    first segment and the segment size.
+    """
+    pool = gdb.parse_and_eval('\'logalloc::shard_segment_pool\'')
+    # FIXME: handle debug-mode build
+    try:
+        base = int(pool['_store']['_segments_base'])
+    except gdb.error:
+        base = int(pool['_segments_base'])  # Scylla 3.0 compatibility
+    segment_size = int(gdb.parse_and_eval('\'logalloc::segment::size\''))
+    return pool, base, segment_size
+
+
 def seastar_memory_layout():
     results = []
     for t in reactor_threads():
@@ -1673,12 +1893,8 @@ class scylla_ptr(gdb.Command):
             ptr_meta.size = span.size() * page_size
             ptr_meta.offset_in_object = ptr - span.start
 
-        # FIXME: handle debug-mode build
-        try:
-            index = gdb.parse_and_eval('(%d - \'logalloc::shard_segment_pool\'._store._segments_base) / \'logalloc::segment\'::size' % (ptr))
-        except gdb.error:
-            index = gdb.parse_and_eval('(%d - \'logalloc::shard_segment_pool\'._segments_base) / \'logalloc::segment\'::size' % (ptr)) # Scylla 3.0 compatibility
-        desc = gdb.parse_and_eval('\'logalloc::shard_segment_pool\'._segments._M_impl._M_start[%d]' % (index))
+        segment_pool, segments_base, segment_size = lsa_segment_pool()
+        desc = segment_pool['_segments']['_M_impl']['_M_start'][(ptr - segments_base) // segment_size]
         ptr_meta.is_lsa = bool(desc['_region'])
 
         return ptr_meta
@@ -1695,14 +1911,9 @@ class scylla_segment_descs(gdb.Command):
         gdb.Command.__init__(self, 'scylla segment-descs', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
 
     def invoke(self, arg, from_tty):
-        # FIXME: handle debug-mode build
-        try:
-            base = int(gdb.parse_and_eval('\'logalloc\'::shard_segment_pool._store._segments_base'))
-        except gdb.error:
-            base = int(gdb.parse_and_eval('\'logalloc\'::shard_segment_pool._segments_base'))
-        segment_size = int(gdb.parse_and_eval('\'logalloc\'::segment::size'))
+        segment_pool, base, segment_size = lsa_segment_pool()
         addr = base
-        for desc in std_vector(gdb.parse_and_eval('\'logalloc\'::shard_segment_pool._segments')):
+        for desc in std_vector(segment_pool['_segments']):
             if desc['_region']:
                 gdb.write('0x%x: lsa free=%-6d used=%-6d %6.2f%% region=0x%x\n' % (addr, desc['_free_space'],
                                                                                    segment_size - int(desc['_free_space']),
@@ -1752,13 +1963,344 @@ class scylla_lsa(gdb.Command):
             region = region + 1
 
 
+class elf_symbols(object):
+    """
+    Address-sorted function and object symbols of an ELF64 little-endian file.
+
+    The symbol table is read once with struct and kept as flat arrays so that
+    lookups are a bisect. Names are kept mangled and demangled on first use.
+
+    Only a .symtab has every symbol: a table read from .dynsym (stripped
+    executables) or an empty one is not `complete` and must not be trusted
+    for misses.
+    """
+
+    _magic = b'SGDBSYM2'
+    _header = struct.Struct('<16sHHIQQQIHHHHHH')
+    _section = struct.Struct('<IIQQQQIIQQ')
+    _symbol = struct.Struct('<IBBHQQ')
+    _SHT_SYMTAB = 2
+    _SHT_NOTE = 7
+    _SHT_DYNSYM = 11
+    _SHF_ALLOC = 0x2
+    _STT_OBJECT = 1
+    _STT_FUNC = 2
+    _NT_GNU_BUILD_ID = 3
+
+    def __init__(self, starts, sizes, name_offsets, names_blob, sections, complete=True):
+        self._complete = complete and len(starts) > 0
+        self._starts = starts
+        self._sizes = sizes
+        self._name_offsets = name_offsets
+        self._names_blob = names_blob
+        self._sections = sections
+        self._demangled = {}
+
+    @staticmethod
+    def _sections_of(data):
+        header = elf_symbols._header.unpack_from(data, 0)
+        ident, shoff, shentsize, shnum, shstrndx = header[0], header[6], header[11], header[12], header[13]
+        if ident[:4] != b'\x7fELF' or ident[4] != 2 or ident[5] != 1:
+            raise ValueError("not an ELF64 little-endian file")
+        sections = [elf_symbols._section.unpack_from(data, shoff + i * shentsize) for i in range(shnum)]
+        strtab = sections[shstrndx]
+        section_names = data[strtab[4]:strtab[4] + strtab[5]]
+        named = {}
+        for section in sections:
+            name = section_names[section[0]:section_names.index(b'\0', section[0])].decode()
+            named[name] = section
+        return sections, named
+
+    @staticmethod
+    def build_id(data):
+        sections, named = elf_symbols._sections_of(data)
+        note = named.get('.note.gnu.build-id')
+        if note is None or note[1] != elf_symbols._SHT_NOTE:
+            return None
+        namesz, descsz, note_type = struct.unpack_from('<III', data, note[4])
+        if note_type != elf_symbols._NT_GNU_BUILD_ID:
+            return None
+        desc = note[4] + 12 + ((namesz + 3) & ~3)
+        return bytes(data[desc:desc + descsz]).hex()
+
+    @classmethod
+    def parse(cls, data):
+        sections, named = cls._sections_of(data)
+        tables = [section for section in sections if section[1] == cls._SHT_SYMTAB]
+        complete = bool(tables)
+        if not tables:
+            tables = [section for section in sections if section[1] == cls._SHT_DYNSYM]
+        symbols = []
+        for table in tables:
+            strtab = sections[table[6]]
+            strings = data[strtab[4]:strtab[4] + strtab[5]]
+            body = data[table[4]:table[4] + table[5] - table[5] % cls._symbol.size]
+            for st_name, st_info, _, st_shndx, st_value, st_size in struct.iter_unpack(cls._symbol.format, body):
+                if st_shndx == 0 or not st_value or (st_info & 0xf) not in (cls._STT_OBJECT, cls._STT_FUNC):
+                    continue
+                symbols.append((st_value, -st_size, st_name, strings))
+        # of aliases at the same address, the one covering the most bytes wins
+        symbols.sort(key=lambda symbol: (symbol[0], symbol[1]))
+        starts = array.array('Q')
+        sizes = array.array('Q')
+        name_offsets = array.array('Q')
+        blob = bytearray()
+        for value, size, st_name, strings in symbols:
+            if starts and starts[-1] == value:
+                continue
+            starts.append(value)
+            sizes.append(-size)
+            name_offsets.append(len(blob))
+            blob += strings[st_name:strings.index(b'\0', st_name)]
+        name_offsets.append(len(blob))
+        allocated = [(section[3], section[3] + section[5]) for section in sections if section[2] & cls._SHF_ALLOC and section[3]]
+        return cls(starts, sizes, name_offsets, bytes(blob), array.array('Q', [bound for section in allocated for bound in section]), complete)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(cls._magic)) != cls._magic:
+                raise ValueError("{} is not a symbol cache".format(path))
+            count, sections, blob_size = struct.unpack('<QQQ', f.read(24))
+            # a cache cut short (e.g. a full disk) must be rebuilt, not trusted
+            expected = len(cls._magic) + 24 + (3 * count + 1 + 2 * sections) * 8 + blob_size
+            if os.fstat(f.fileno()).st_size != expected:
+                raise ValueError("{} is truncated or corrupt".format(path))
+            arrays = []
+            for length in (count, count, count + 1, sections * 2):
+                values = array.array('Q')
+                values.frombytes(f.read(length * values.itemsize))
+                arrays.append(values)
+            blob = f.read(blob_size)
+        starts, sizes, name_offsets, bounds = arrays
+        return cls(starts, sizes, name_offsets, blob, bounds)
+
+    def save(self, path):
+        # written aside and renamed into place, so readers never see a partial cache
+        temporary = '{}.{}'.format(path, os.getpid())
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(self._magic)
+                f.write(struct.pack('<QQQ', len(self._starts), len(self._sections) // 2, len(self._names_blob)))
+                for values in (self._starts, self._sizes, self._name_offsets, self._sections):
+                    f.write(values.tobytes())
+                f.write(self._names_blob)
+            os.rename(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def __len__(self):
+        return len(self._starts)
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def covers(self, value):
+        sections = self._sections
+        for i in range(0, len(sections), 2):
+            if sections[i] <= value < sections[i + 1]:
+                return True
+        return False
+
+    def mangled(self, index):
+        return self._names_blob[self._name_offsets[index]:self._name_offsets[index + 1]].decode('utf-8', 'replace')
+
+    def name(self, index):
+        if index not in self._demangled:
+            mangled = self.mangled(index)
+            demangled = mangled
+            if mangled.startswith('_Z'):
+                try:
+                    demangled = gdb.execute('demangle -l c++ -- %s' % mangled, False, True).strip()
+                except gdb.error:
+                    pass
+                if not demangled or demangled.startswith("Can't demangle"):
+                    demangled = mangled
+            self._demangled[index] = demangled
+        return self._demangled[index]
+
+    def lookup(self, value):
+        """
+        Returns (name, offset) of the symbol containing value, or None.
+        """
+        index = bisect.bisect_right(self._starts, value) - 1
+        if index < 0:
+            return None
+        start = self._starts[index]
+        size = self._sizes[index]
+        if size and value >= start + size:
+            return None
+        return self.name(index), value - start
+
+    def lookup_many(self, values):
+        """
+        Returns {value: (name, offset) or None} for all values. The values are
+        sorted, so each bisect starts where the previous one ended.
+        """
+        starts = self._starts
+        result = {}
+        index = 0
+        for value in sorted(set(values)):
+            index = bisect.bisect_right(starts, value, index)
+            if index == 0:
+                result[value] = None
+                continue
+            start = starts[index - 1]
+            size = self._sizes[index - 1]
+            result[value] = None if size and value >= start + size else (self.name(index - 1), value - start)
+        return result
+
+
+class symbol_resolver(object):
+    """
+    Resolves addresses in the main executable with elf_symbols instead of
+    running `info symbol` for each of them.
+
+    The parsed symbol table is cached on disk, keyed by the executable's
+    build-id, under $XDG_CACHE_HOME/scylla-gdb (~/.cache/scylla-gdb by default).
+    Addresses outside the executable (shared libraries, heap) are left to gdb.
+    """
+
+    _instance = None
+    _failed = False
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._symbols = self._cached(filename, data)
+            sections, named = elf_symbols._sections_of(data)
+            rodata = named.get('.rodata')
+        finally:
+            data.close()
+        # position independent executables are relocated, measure by how much with .rodata
+        self._bias = 0
+        if rodata is not None:
+            start, _ = get_text_range()
+            self._bias = start - rodata[3]
+
+    @property
+    def bias(self):
+        return self._bias
+
+    @staticmethod
+    def _cache_dir():
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'scylla-gdb')
+
+    def _cached(self, filename, data):
+        build_id = elf_symbols.build_id(data)
+        path = os.path.join(self._cache_dir(), build_id + '.symbols') if build_id else None
+        if path and os.path.exists(path):
+            try:
+                return elf_symbols.load(path)
+            except (OSError, ValueError, struct.error):
+                pass
+        gdb.write('Reading symbols of {} for fast address resolution...\n'.format(filename))
+        symbols = elf_symbols.parse(data)
+        if not symbols.complete:
+            symbols = self._parse_debug_file(filename) or symbols
+        if not symbols.complete:
+            # not cached: the unstripped executable has the same build-id
+            gdb.write('No symbol table in {}, leaving symbol lookups to gdb\n'.format(filename))
+            return symbols
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                symbols.save(path)
+            except OSError as e:
+                gdb.write('Could not cache symbols in {}: {}\n'.format(path, e))
+        return symbols
+
+    @staticmethod
+    def _parse_debug_file(filename):
+        """
+        The symbols of the separate debug info file gdb loaded for filename, if any.
+        """
+        for objfile in gdb.objfiles():
+            owner = getattr(objfile, 'owner', None)
+            if owner is None or owner.filename != filename:
+                continue
+            with open(objfile.filename, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                symbols = elf_symbols.parse(data)
+            finally:
+                data.close()
+            if symbols.complete:
+                return symbols
+        return None
+
+    @classmethod
+    def current(cls):
+        if cls._instance is None and not cls._failed:
+            filename = gdb.current_progspace().filename
+            try:
+                cls._instance = symbol_resolver(filename)
+            except Exception as e:
+                # resolve() falls back to `info symbol` for everything
+                gdb.write('Fast symbol resolution is not available for {}: {}\n'.format(filename, e))
+                cls._failed = True
+        return cls._instance
+
+    @classmethod
+    def invalidate(cls, *_):
+        cls._instance = None
+        cls._failed = False
+
+    def resolve(self, addr):
+        """
+        Returns the name in the `info symbol` format ("symbol + offset "),
+        or False when gdb has to be asked: addr is outside the executable,
+        is not in any symbol, or the symbol table is incomplete.
+        """
+        if not self._symbols.complete:
+            return False
+        value = addr - self._bias
+        if not self._symbols.covers(value):
+            return False
+        found = self._symbols.lookup(value)
+        if found is None:
+            return False
+        return self._format(found)
+
+    def resolve_many(self, addresses):
+        """
+        Like resolve() for each of addresses, with a single pass over the
+        symbol table. Returns {addr: name or False}.
+        """
+        if not self._symbols.complete:
+            return dict((addr, False) for addr in addresses)
+        values = dict((addr, addr - self._bias) for addr in addresses)
+        found = self._symbols.lookup_many(value for value in values.values() if self._symbols.covers(value))
+        return dict((addr, self._format(found[value]) if found.get(value) is not None else False) for addr, value in values.items())
+
+    @staticmethod
+    def _format(found):
+        name, offset = found
+        if offset:
+            return '%s + %d ' % (name, offset)
+        return '%s ' % name
+
+
 names = {}  # addr (int) -> name (str)
 
 
 def resolve(addr, cache=True):
+    addr = int(addr)
     if addr in names:
         return names[addr]
 
+    resolver = symbol_resolver.current()
+    name = resolver.resolve(addr) if resolver is not None else False
+    if name is not False:
+        if cache:
+            names[addr] = name
+        return name
+
     infosym = gdb.execute('info symbol 0x%x' % (addr), False, True)
     if infosym.startswith('No symbol'):
         name = None
@@ -1769,6 +2311,27 @@ def resolve(addr, cache=True):
     return name
 
 
+def resolve_many(addresses, cache=True):
+    """
+    Resolves all addresses at once, returns {addr: name}. Addresses the
+    executable's symbol table does not answer for are resolved one by one.
+    """
+    addresses = set(int(addr) for addr in addresses)
+    result = dict((addr, names[addr]) for addr in addresses if addr in names)
+    missing = [addr for addr in addresses if addr not in result]
+    resolver = symbol_resolver.current()
+    if resolver is not None and missing:
+        for addr, name in resolver.resolve_many(missing).items():
+            if name is not False:
+                result[addr] = name
+                if cache:
+                    names[addr] = name
+    for addr in missing:
+        if addr not in result:
+            result[addr] = resolve(addr, cache)
+    return result
+
+
 class lsa_object_descriptor(object):
     @staticmethod
     def decode(pos):
@@ -2219,8 +2782,9 @@ class scylla_task_stats(gdb.Command):
         for ptr in get_local_tasks():
             vptr = int(ptr.reinterpret_cast(vptr_type).dereference())
             vptr_count[vptr] += 1
+        symbols = resolve_many(vptr_count)
         for vptr, count in sorted(vptr_count.items(), key=lambda e: -e[1]):
-            gdb.write('%10d: 0x%x %s\n' % (count, vptr, resolve(vptr)))
+            gdb.write('%10d: 0x%x %s\n' % (count, vptr, symbols[vptr]))
 
 
 class scylla_tasks(gdb.Command):
@@ -2482,6 +3046,443 @@ class scylla_fiber(gdb.Command):
             return
 
 
+class reference_index(object):
+    """
+    Reverse reference index of the current shard's live objects: maps pointer
+    values to the (object, offset) pairs holding them.
+
+    Built in a single pass over the page table, reading every live span in
+    bulk and keeping the 8-byte aligned words which point into the seastar
+    heap or into .rodata (vtables). Free small objects (on the pool's or the
+    span's free list) are left out, so results match what `scylla find` used
+    to report after checking each hit with `scylla ptr`. The entries are kept
+    sorted by value, so a lookup is a binary search.
+
+    Indexes are kept per thread until the inferior runs again and can be
+    saved to and loaded from a file.
+    """
+
+    _magic = b'SGDBREF1'
+    _header = struct.Struct('<QQQQQ')
+    _chunk = 1 << 24
+    _cache = {}
+
+    def __init__(self, values, objects, offsets, ranges):
+        """
+        :param values: the referenced values, sorted.
+        :param objects: the start of the object holding each value.
+        :param offsets: the offset of each value inside its object.
+        :param ranges: the [start, end) address ranges which were indexed.
+        """
+        self._values = values
+        self._objects = objects
+        self._offsets = offsets
+        self._ranges = ranges
+
+    @staticmethod
+    def _key():
+        thread = gdb.selected_thread()
+        return (gdb.selected_inferior().num, thread.global_num if thread else None)
+
+    @staticmethod
+    def _indexed_ranges():
+        mem_start, mem_size = get_seastar_memory_start_and_size()
+        text_start, text_end = get_text_range()
+        return ((mem_start, mem_start + mem_size), (text_start, text_end + 1))
+
+    @classmethod
+    def current(cls):
+        """
+        The index of the selected thread's shard, None if it was not built (or loaded).
+        """
+        return cls._cache.get(cls._key())
+
+    @classmethod
+    def invalidate(cls, *_):
+        cls._cache.clear()
+
+    @classmethod
+    def drop(cls):
+        cls._cache.pop(cls._key(), None)
+
+    @staticmethod
+    def _walk_free_list(head, free):
+        inferior = gdb.selected_inferior()
+        while head and head not in free:
+            free.add(head)
+            try:
+                head, = struct.unpack('<Q', inferior.read_memory(head, 8))
+            except gdb.MemoryError:
+                break
+
+    @staticmethod
+    def _free_objects(table, small_spans):
+        free = set()
+        for pool in set(sp.pool_address() for sp in small_spans):
+            reference_index._walk_free_list(int(gdb.Value(pool).cast(table.pool_type).dereference()['_free']), free)
+        for sp in small_spans:
+            reference_index._walk_free_list(table.freelist[sp.index], free)
+        return free
+
+    @classmethod
+    def build(cls):
+        table = page_table.current()
+        page_size = table.page_size
+        ranges = cls._indexed_ranges()
+        object_size = small_pool_object_sizes()
+        inferior = gdb.selected_inferior()
+
+        live_spans = [sp for sp in table.spans() if not sp.is_free()]
+        free = cls._free_objects(table, [sp for sp in live_spans if sp.is_small()])
+        if numpy is not None:
+            free_objects = numpy.array(sorted(free), dtype=numpy.int64)
+
+        values, objects, offsets = [], [], []
+        for sp in live_spans:
+            if sp.is_small():
+                objsize = object_size(sp)
+                length = sp.used_span_size() * page_size // objsize * objsize
+            else:
+                objsize = length = sp.size() * page_size
+            for chunk_start in range(0, length - length % 8, cls._chunk):
+                chunk_size = min(cls._chunk, length - length % 8 - chunk_start)
+                base = sp.start + chunk_start
+                try:
+                    buf = inferior.read_memory(base, chunk_size)
+                except gdb.MemoryError:
+                    continue
+                if numpy is not None:
+                    words = numpy.frombuffer(buf, dtype='<u8', count=chunk_size // 8)
+                    mask = numpy.zeros(len(words), dtype=bool)
+                    for start, end in ranges:
+                        mask |= (words >= start) & (words < end)
+                    positions = numpy.flatnonzero(mask)
+                    found = words[positions]
+                    positions = positions * 8 + chunk_start
+                    starts = positions // objsize * objsize + sp.start
+                    if sp.is_small() and len(free_objects):
+                        # free_objects is sorted, a bisection per candidate keeps this independent of the free list size
+                        nearest = numpy.minimum(numpy.searchsorted(free_objects, starts), len(free_objects) - 1)
+                        live = free_objects[nearest] != starts
+                        found, positions, starts = found[live], positions[live], starts[live]
+                    values.append(found)
+                    objects.append(starts)
+                    offsets.append(positions - (starts - sp.start))
+                    continue
+                for i, word in enumerate(memoryview(buf).cast('B').cast('Q')):
+                    if not any(start <= word < end for start, end in ranges):
+                        continue
+                    position = chunk_start + i * 8
+                    obj = sp.start + position // objsize * objsize
+                    if obj in free:
+                        continue
+                    values.append(word)
+                    objects.append(obj)
+                    offsets.append(position - (obj - sp.start))
+
+        if numpy is not None:
+            values, objects, offsets = (numpy.concatenate(column).astype(numpy.uint64) if column else numpy.zeros(0, dtype=numpy.uint64)
+                                        for column in (values, objects, offsets))
+            order = numpy.argsort(values, kind='stable')
+            index = reference_index(values[order], objects[order], offsets[order], ranges)
+        else:
+            order = sorted(range(len(values)), key=values.__getitem__)
+            index = reference_index(*(array.array('Q', (column[i] for i in order)) for column in (values, objects, offsets)), ranges=ranges)
+        cls._cache[cls._key()] = index
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved by save() for the selected thread's shard.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(cls._magic)) != cls._magic:
+                raise ValueError("{} is not a reference index".format(path))
+            count, mem_start, mem_end, text_start, text_end = cls._header.unpack(f.read(cls._header.size))
+            ranges = ((mem_start, mem_end), (text_start, text_end))
+            if ranges != cls._indexed_ranges():
+                raise ValueError("{} was saved for a different shard or binary".format(path))
+            if numpy is not None:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                offset = len(cls._magic) + cls._header.size
+                columns = [numpy.frombuffer(data, dtype='<u8', count=count, offset=offset + i * count * 8) for i in range(3)]
+            else:
+                columns = []
+                for i in range(3):
+                    column = array.array('Q')
+                    column.frombytes(f.read(count * 8))
+                    columns.append(column)
+        index = reference_index(columns[0], columns[1], columns[2], ranges)
+        cls._cache[cls._key()] = index
+        return index
+
+    def save(self, path):
+        (mem_start, mem_end), (text_start, text_end) = self._ranges
+        with open(path, 'wb') as f:
+            f.write(self._magic)
+            f.write(self._header.pack(len(self), mem_start, mem_end, text_start, text_end))
+            for column in (self._values, self._objects, self._offsets):
+                f.write(column.tobytes())
+
+    def __len__(self):
+        return len(self._values)
+
+    def covers(self, value):
+        return any(start <= value < end for start, end in self._ranges)
+
+    def lookup(self, value):
+        """
+        Returns the (object, offset) pairs referencing value.
+        """
+        if numpy is not None:
+            first = numpy.searchsorted(self._values, numpy.uint64(value), side='left')
+            last = numpy.searchsorted(self._values, numpy.uint64(value), side='right')
+            return list(zip(self._objects[first:last].tolist(), self._offsets[first:last].tolist()))
+        first = bisect.bisect_left(self._values, value)
+        last = bisect.bisect_right(self._values, value, first)
+        return list(zip(self._objects[first:last], self._offsets[first:last]))
+
+
+class scylla_reference_index(gdb.Command):
+    """Build, save or load the reverse reference index of the current shard.
+
+    With the index in place `scylla find` and `scylla generate-object-graph`
+    look up 64 bit values pointing into the seastar heap or into .rodata in
+    the index instead of scanning the whole memory for each of them. The index
+    is a snapshot: it is dropped when the inferior runs again.
+
+    See `scylla reference-index --help` for more details on usage.
+
+    Example:
+
+      (gdb) scylla reference-index --save /tmp/shard0.refs
+      Indexed 12345678 references in 42.1s
+      (gdb) scylla reference-index --load /tmp/shard0.refs
+      Loaded 12345678 references
+    """
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla reference-index', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla reference-index")
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("-l", "--load", action="store", type=str,
+                           help="Load the index from the file instead of building it.")
+        group.add_argument("-d", "--drop", action="store_true", default=False,
+                           help="Drop the index of the current shard.")
+        parser.add_argument("-s", "--save", action="store", type=str,
+                            help="Save the (built) index to the file.")
+
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        if args.drop:
+            reference_index.drop()
+            return
+
+        if args.load:
+            index = reference_index.load(args.load)
+            gdb.write('Loaded {} references\n'.format(len(index)))
+        else:
+            start_time = time.time()
+            index = reference_index.build()
+            gdb.write('Indexed {} references in {:.1f}s\n'.format(len(index), time.time() - start_time))
+
+        if args.save:
+            index.save(args.save)
+
+
+class heap_snapshot_writer(object):
+    """
+    Writes the allocator state of the current shard into a file which can be
+    analyzed without gdb, see scripts/scylla-heap-snapshot.
+
+    The file starts with a header and a table of named sections, each of them
+    aligned to a page so that they can be mapped and viewed in place:
+
+    * meta: JSON, the layout of everything else (page size, field offsets...).
+    * pages: cpu_mem.pages as it is in memory.
+    * pools: (address, object size, free list head) of every small pool, '<QQQ'.
+    * lsa: the shard_segment_pool's segment descriptors as they are in memory.
+    * ranges: (address, length) of the dumped memory ranges, '<QQ'.
+    * memory: the contents of those ranges, one after the other.
+
+    The format is versioned; bump `version` (in the analyzer too) on changes.
+    """
+
+    magic = b'SGDBHEAP'
+    version = 1
+    header = struct.Struct('<8sII')
+    section = struct.Struct('<16sQQ')
+    max_sections = 8
+    alignment = 4096
+    _chunk = 1 << 24
+
+    def __init__(self, f):
+        self._file = f
+        self._sections = []
+        self._file.write(b'\0' * (self.header.size + self.max_sections * self.section.size))
+
+    def _align(self):
+        padding = -self._file.tell() % self.alignment
+        self._file.write(b'\0' * padding)
+
+    def begin_section(self, name):
+        self._align()
+        self._sections.append([name, self._file.tell(), 0])
+
+    def write(self, data):
+        self._file.write(data)
+        self._sections[-1][2] += memoryview(data).nbytes
+
+    def add_section(self, name, data):
+        self.begin_section(name)
+        self.write(data)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self.header.pack(self.magic, self.version, len(self._sections)))
+        for name, offset, size in self._sections:
+            self._file.write(self.section.pack(name.encode(), offset, size))
+
+    @staticmethod
+    def _layout(gdb_type, names):
+        layouts = {}
+        for name in names:
+            layout = field_layout(gdb_type, name)
+            layouts[name] = dict(offset=layout.offset, shift=layout.shift, mask=layout.mask, size=layout.size)
+        return layouts
+
+    @staticmethod
+    def _lsa(inferior):
+        """
+        Returns the meta and the raw descriptors of the LSA segments, or None
+        when LSA is not there.
+        """
+        try:
+            pool, base, segment_size = lsa_segment_pool()
+        except gdb.error:
+            return None, b''
+        segments = pool['_segments']['_M_impl']
+        start = int(segments['_M_start'])
+        desc_type = segments['_M_start'].type.target().strip_typedefs()
+        length = int(segments['_M_finish']) - start
+        meta = dict(segments_base=base,
+                    segment_size=segment_size,
+                    descriptor_size=desc_type.sizeof,
+                    fields=heap_snapshot_writer._layout(desc_type, ('_region', '_free_space')))
+        return meta, bytes(inferior.read_memory(start, length)) if length else b''
+
+    @classmethod
+    def dump(cls, path, memory):
+        """
+        :param path: the file to write.
+        :param memory: which spans to include the memory of: 'small', 'all'
+            or 'none'.
+
+        :returns: the number of memory bytes written.
+        """
+        table = page_table.current()
+        inferior = gdb.selected_inferior()
+        page_type = table.pages.type.target().strip_typedefs()
+        object_size = small_pool_object_sizes()
+        live_spans = [sp for sp in table.spans() if not sp.is_free()]
+        small_spans = [sp for sp in live_spans if sp.is_small()]
+
+        pools = {}
+        for sp in small_spans:
+            if sp.pool_address() not in pools:
+                pools[sp.pool_address()] = (object_size(sp), int(sp.pool().dereference()['_free']))
+
+        resolver = symbol_resolver.current()
+        lsa, descriptors = cls._lsa(inferior)
+        text_start, text_end = get_text_range()
+        meta = dict(shard=current_shard(),
+                    page_size=table.page_size,
+                    nr_pages=table.nr_pages,
+                    memory_start=table.memory_start,
+                    record_size=table.record_size,
+                    page_fields=cls._layout(page_type, page_table._fields),
+                    text_range=[text_start, text_end],
+                    executable=gdb.current_progspace().filename,
+                    load_bias=resolver.bias if resolver is not None else 0,
+                    lsa=lsa)
+
+        spans = {'small': small_spans, 'all': live_spans, 'none': []}[memory]
+        written = 0
+        with open(path, 'wb') as f:
+            writer = cls(f)
+            writer.add_section('meta', json.dumps(meta, sort_keys=True).encode())
+            writer.add_section('pages', bytes(inferior.read_memory(int(table.pages), table.nr_pages * table.record_size)))
+            writer.add_section('pools', b''.join(struct.pack('<QQQ', address, size, free) for address, (size, free) in sorted(pools.items())))
+            writer.add_section('lsa', descriptors)
+            ranges = []
+            writer.begin_section('memory')
+            for sp in spans:
+                length = (sp.used_span_size() if sp.is_small() else sp.size()) * table.page_size
+                for chunk_start in range(0, length, cls._chunk):
+                    address = sp.start + chunk_start
+                    size = min(cls._chunk, length - chunk_start)
+                    try:
+                        buf = inferior.read_memory(address, size)
+                    except gdb.MemoryError:
+                        continue
+                    writer.write(buf)
+                    if ranges and ranges[-1][0] + ranges[-1][1] == address:
+                        ranges[-1][1] += size
+                    else:
+                        ranges.append([address, size])
+                    written += size
+            writer.add_section('ranges', b''.join(struct.pack('<QQ', address, size) for address, size in ranges))
+            writer.close()
+        return written
+
+
+class scylla_dump_heap_snapshot(gdb.Command):
+    """Dump the allocator state of the current shard into a file.
+
+    The snapshot contains the page table, the small pools, the LSA segment
+    descriptors and (by default) the memory of the small-object spans. The
+    reports below can then be run on it outside of gdb, in parallel and as
+    many times as needed, with scripts/scylla-heap-snapshot:
+
+    * histogram: vptr counts of all small objects (like `scylla task_histogram --all`).
+    * spans: per-pool span utilization (like the small pools of `scylla memory`).
+    * lsa: LSA segment occupancy (like `scylla segment-descs`, summarized).
+
+    Dump the memory of the large spans as well (`--memory all`) to analyze
+    objects allocated there too; this can be as big as the shard's memory.
+
+    See `scylla dump-heap-snapshot --help` for more details on usage.
+
+    Example:
+
+      (gdb) scylla dump-heap-snapshot /tmp/shard3.heap
+      Wrote /tmp/shard3.heap with 1262485504 bytes of memory in 41.9s
+      $ scripts/scylla-heap-snapshot /tmp/shard3.heap histogram -e build/release/scylla
+    """
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla dump-heap-snapshot', gdb.COMMAND_USER, gdb.COMPLETE_FILENAME)
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla dump-heap-snapshot")
+        parser.add_argument("-m", "--memory", action="store", choices=['small', 'all', 'none'], default='small',
+                            help="The spans to dump the memory of. Defaults to small (small-object spans only).")
+        parser.add_argument("file", action="store", help="The file to write the snapshot to.")
+
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        start_time = time.time()
+        written = heap_snapshot_writer.dump(args.file, args.memory)
+        gdb.write('Wrote {} with {} bytes of memory in {:.1f}s\n'.format(args.file, written, time.time() - start_time))
+
+
 def find_in_live(mem_start, mem_size, value, size_selector='g'):
     for line in gdb.execute("find/%s 0x%x, +0x%x, 0x%x" % (size_selector, mem_start, mem_size, value), to_string=True).split('\n'):
         if line.startswith('0x'):
@@ -2505,6 +3506,11 @@ class scylla_find(gdb.Command):
       (gdb) scylla find 0x600005321900
       thread 1, small (size <= 512), live (0x6000000f3800 +48)
       thread 1, small (size <= 56), live (0x6000008a1230 +32)
+
+    When a reverse reference index was built for the shard (see
+    `scylla reference-index`), 64 bit values are looked up in it instead of
+    searching the memory. The index only holds 8-byte aligned references,
+    use `--no-index` to search the memory for unaligned ones too.
     """
     _vptr_type = gdb.lookup_type('uintptr_t').pointer()
 
@@ -2512,7 +3518,22 @@ class scylla_find(gdb.Command):
         gdb.Command.__init__(self, 'scylla find', gdb.COMMAND_USER, gdb.COMPLETE_NONE, True)
 
     @staticmethod
-    def find(value, size_selector='g'):
+    def index_for(value, size_selector='g'):
+        """
+        Returns the reference index find() would look value up in, None if it would scan the memory.
+        """
+        index = reference_index.current()
+        if index is not None and size_selector == 'g' and index.covers(value):
+            return index
+        return None
+
+    @staticmethod
+    def find(value, size_selector='g', use_index=True):
+        index = scylla_find.index_for(value, size_selector) if use_index else None
+        if index is not None:
+            for obj, off in index.lookup(value):
+                yield (obj, off)
+            return
         mem_start, mem_size = get_seastar_memory_start_and_size()
         for obj, off in find_in_live(mem_start, mem_size, value, size_selector):
             yield (obj, off)
@@ -2528,6 +3549,9 @@ class scylla_find(gdb.Command):
         parser.add_argument("-r", "--resolve", action="store_true",
                 help="Attempt to resolve the first pointer in the found objects as vtable pointer. "
                 " If the resolve is successful the vtable pointer as well as the vtable symbol name will be printed in the listing.")
+        parser.add_argument("-n", "--no-index", action="store_true", default=False,
+                            help="Search the memory even if the shard has a reverse reference index."
+                            " The index only holds 8-byte aligned values, the search finds unaligned ones too.")
         parser.add_argument("value", action="store", help="The value to be searched.")
 
         try:
@@ -2548,7 +3572,12 @@ class scylla_find(gdb.Command):
 
         size_char = size_arg_to_size_char[args.size]
 
-        for obj, off in scylla_find.find(int(gdb.parse_and_eval(args.value)), size_char):
+        value = int(gdb.parse_and_eval(args.value))
+        use_index = not args.no_index
+        if use_index and scylla_find.index_for(value, size_char) is not None:
+            gdb.write('Looking up the reference index (8-byte aligned references only), use --no-index to search the memory\n')
+
+        for obj, off in scylla_find.find(value, size_char, use_index):
             ptr_meta = scylla_ptr.analyze(obj + off)
             if args.resolve:
                 maybe_vptr = int(gdb.Value(obj).reinterpret_cast(scylla_find._vptr_type).dereference())
@@ -2793,6 +3822,10 @@ class scylla_generate_object_graph(gdb.Command):
     file will contain the full name of vtable symbols. The graph will only contain
     cropped versions of those to keep the size reasonable.
 
+    Each vertex is found with `scylla find`, so building the reverse
+    reference index first (`--index` or `scylla reference-index`) makes large
+    graphs much cheaper to generate.
+
     See `scylla generate_object_graph --help` for more details on usage.
     Also see `man dot` for more information on supported output formats.
 
@@ -2893,6 +3926,8 @@ class scylla_generate_object_graph(gdb.Command):
                 help="Maximum amount of vertices (objects) to add to the object graph. Set to -1 to unlimited. Default is -1 (unlimited).")
         parser.add_argument("-t", "--timeout", action="store", type=int, default=-1,
                 help="Maximum amount of seconds to spend building the graph. Set to -1 for no timeout. Default is -1 (unlimited).")
+        parser.add_argument("-i", "--index", action="store_true", default=False,
+                            help="Build the reverse reference index of the shard first, unless it already has one. See `scylla reference-index`.")
         parser.add_argument("object", action="store", help="The object that is the starting point of the graph.")
 
         try:
@@ -2916,6 +3951,11 @@ class scylla_generate_object_graph(gdb.Command):
         if args.max_depth == -1 and args.max_vertices == -1 and args.timeout == -1:
             raise ValueError("The search has to be limited by at least one of: MAX_DEPTH, MAX_VERTICES or TIMEOUT")
 
+        if args.index and reference_index.current() is None:
+            reference_index.build()
+        if reference_index.current() is not None:
+            gdb.write('Following references with the reference index (8-byte aligned references only)\n')
+
         scylla_generate_object_graph.generate_object_graph(int(gdb.parse_and_eval(args.object)), dot_file,
                 args.max_depth, args.max_vertices, args.timeout)
 
@@ -3085,6 +4125,15 @@ class scylla_gdb_func_downcast_vptr(gdb.Function):
         return ptr.reinterpret_cast(actual_type)
 
 
+# Snapshots of the inferior's memory are only valid while it is stopped
+gdb.events.cont.connect(page_table.invalidate)
+gdb.events.exited.connect(page_table.invalidate)
+gdb.events.new_objfile.connect(page_table.invalidate)
+gdb.events.new_objfile.connect(symbol_resolver.invalidate)
+gdb.events.cont.connect(reference_index.invalidate)
+gdb.events.exited.connect(reference_index.invalidate)
+gdb.events.new_objfile.connect(reference_index.invalidate)
+
 # Commands
 scylla()
 scylla_databases()
@@ -3109,6 +4158,8 @@ scylla_tasks()
 scylla_task_queues()
 scylla_fiber()
 scylla_find()
+scylla_reference_index()
+scylla_dump_heap_snapshot()
 scylla_task_histogram()
 scylla_active_sstables()
 scylla_netw()
@@ -0,0 +1,103 @@
+import logging
+import os
+import re
+import numpy
+import matcher
+import parseexception
+
+VALUE = 'value'
+RATE = 'rate'
+SIGMA = 'sigma'
+_UNITS = {'': VALUE, '/s': RATE, 'sigma': SIGMA}
+_EXPRESSION = re.compile(r'^(?P<pattern>.+?)(?P<operator>[<>])(?P<limit>[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)(?P<unit>/s|sigma)?$')
+
+
+class Threshold(object):
+    def __init__(self, pattern, operator, limit, measure):
+        self._matcher = matcher.Matcher([pattern])
+        self._text = '{}{}{:g}'.format(pattern, operator, limit)
+        self._above = operator == '>'
+        self._limit = limit
+        self._measure = measure
+
+    @property
+    def measure(self):
+        return self._measure
+
+    def matches(self, metric):
+        if self._measure != VALUE and not metric.is_counter:
+            return False
+        return self._matcher.matches(metric.key)
+
+    def breaches(self, vector):
+        with numpy.errstate(invalid='ignore'):
+            if self._measure == SIGMA:
+                vector = numpy.abs(vector)
+            return vector > self._limit if self._above else vector < self._limit
+
+    def __repr__(self):
+        return self._text + {VALUE: '', RATE: '/s', SIGMA: 'sigma'}[self._measure]
+
+
+def parseThreshold(text):
+    match = _EXPRESSION.match(text.strip())
+    if match is None:
+        raise parseexception.ParseException('could not parse threshold {}, expected GLOB>LIMIT, GLOB<LIMIT/s or GLOB>Ksigma'.format(text))
+    measure = _UNITS[match.group('unit') or '']
+    if measure == SIGMA and match.group('operator') != '>':
+        raise parseexception.ParseException('a deviation threshold can only be an upper bound: {}'.format(text))
+    return Threshold(match.group('pattern'), match.group('operator'), float(match.group('limit')), measure)
+
+
+def terminalBell(loop):
+    # the screen belongs to the main loop, which rings the bell when it reads the pipe
+    def ring(data):
+        loop.screen.write('\a')
+        loop.screen.flush()
+        return True
+
+    pipe = loop.watch_pipe(ring)
+    return lambda: os.write(pipe, b'\a')
+
+
+class Alerts(object):
+    def __init__(self, thresholds, bell=None, stop=False):
+        self._thresholds = thresholds
+        self._bell = bell
+        self._stop = stop
+        self._selections = []
+        self._breaching = set()
+        self._breached = False
+        self._generation = None
+
+    @property
+    def breached(self):
+        return self._breached
+
+    def update(self, liveData):
+        if self._generation != liveData.generation:
+            self._selections = []
+            for threshold in self._thresholds:
+                metrics = [metric for metric in liveData.measurements if threshold.matches(metric)]
+                self._selections.append((threshold, metrics, numpy.array([metric.row for metric in metrics], dtype=numpy.intp)))
+            self._generation = liveData.generation
+        store = liveData.store
+        vectors = {VALUE: store.current(), RATE: store.rates(), SIGMA: store.deviations()}
+        breaching = set()
+        for threshold, metrics, rows in self._selections:
+            values = vectors[threshold.measure][rows]
+            for i in numpy.flatnonzero(threshold.breaches(values)).tolist():
+                breaching.add((threshold, metrics[i].key))
+                if (threshold, metrics[i].key) not in self._breaching:
+                    # in the interactive mode errors would be printed over the screen
+                    log = logging.error if self._stop else logging.warning
+                    log('alert: {} breached {} with {:.1f}'.format(metrics[i].symbol, threshold, values[i]))
+        started = breaching - self._breaching
+        self._breaching = breaching
+        if not started:
+            return
+        self._breached = True
+        if self._bell is not None:
+            self._bell()
+        if self._stop:
+            liveData.stop()
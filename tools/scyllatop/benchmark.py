@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import statistics
+import time
+import fake
+import fetcher
+import instrumentation
+import livedata
+import prometheus
+import views.aggregate
+import views.histogram
+import views.rate
+import views.simple
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_TICKS = 5
+_SCREEN = (200, 60)
+# counters and histogram series a single table contributes on one shard
+_PER_CELL = fake.DEFAULT_FAMILIES + fake.DEFAULT_HISTOGRAMS * (len(fake.BUCKETS) + 3)
+_COLUMNS = ('series', 'bytes', 'fetch', 'parse', 'discovery', 'aggregate', 'render', 'tick')
+
+
+def _shards(size):
+    return 4 if size < 10000 else 16 if size < 100000 else 32 if size < 1000000 else 64
+
+
+def _generator(size):
+    shards = _shards(size)
+    tables = max(1, int(round(size / float(shards * _PER_CELL))))
+    return fake.Generator(shards, fake.DEFAULT_FAMILIES, tables, fake.DEFAULT_HISTOGRAMS)
+
+
+def _milliseconds(seconds):
+    return '{:.1f}'.format(seconds * 1000)
+
+
+def benchmark(size, ticks, interval):
+    generator = _generator(size)
+    server = fake.Server()
+    source = prometheus.Prometheus(server.url)
+    start = time.monotonic()
+    liveData = None
+    liveViews = [views.simple.Simple(), views.aggregate.Aggregate(), views.rate.Rate(), views.histogram.Histogram()]
+    results = []
+    try:
+        for tick in range(ticks + 1):
+            server.body = generator.render(interval * tick)
+            instrumentation.publish(instrumentation.SCRAPE)
+            began = time.monotonic()
+            if liveData is None:
+                # the first tick pays for interning and attaching every series
+                liveData = livedata.LiveData(['*'], interval, source)
+                snapshot = source.snapshot()
+            else:
+                source.invalidate()
+                snapshot = source.snapshot()
+                liveData.advance(fetcher.Tick(snapshot, time.monotonic() - began, 0))
+            instrumentation.publish(instrumentation.SCRAPE)
+            scraped = instrumentation.last()
+            discovered = time.monotonic()
+            for view in liveViews:
+                view.update(liveData)
+            aggregated = time.monotonic()
+            for view in liveViews:
+                view.widget().render(_SCREEN, focus=True)
+            rendered = time.monotonic()
+            fetch = scraped[instrumentation.FETCH]
+            parse = scraped[instrumentation.PARSE]
+            results.append(dict(series=len(snapshot.samples), bytes=scraped[instrumentation.FETCH_BYTES], fetch=fetch, parse=parse,
+                                discovery=discovered - began - fetch - parse, aggregate=aggregated - discovered,
+                                render=rendered - aggregated, tick=rendered - began))
+        liveData.stop()
+    finally:
+        server.close()
+    logging.info('benchmark: {} series generated and scraped in {:.1f}s'.format(size, time.monotonic() - start))
+    return results[0], results[1:]
+
+
+def _row(name, result):
+    cells = [str(result['series']), str(result['bytes'])] + [_milliseconds(result[column]) for column in _COLUMNS[2:]]
+    return [name] + cells
+
+
+def _median(results):
+    median = dict((column, statistics.median(result[column] for result in results)) for column in _COLUMNS)
+    median['series'] = int(median['series'])
+    median['bytes'] = int(median['bytes'])
+    return median
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time full scyllatop ticks (fetch, parse, discovery, aggregate, render) against a synthetic '
+                                                 'Prometheus endpoint. Times are in milliseconds, steady state is the median over --ticks ticks.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="approximate number of series, default: {}".format(DEFAULT_SIZES))
+    parser.add_argument('-t', '--ticks', type=int, default=DEFAULT_TICKS, help="steady state ticks measured per size, default: {}".format(DEFAULT_TICKS))
+    parser.add_argument('-i', '--interval', type=float, default=1, help="simulated seconds between ticks, default: 1")
+    parser.add_argument('-v', '--verbosity', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='WARNING')
+    arguments = parser.parse_args()
+    logging.basicConfig(level=getattr(logging, arguments.verbosity), format='%(levelname)s: %(message)s')
+
+    rows = [['size', 'tick'] + list(_COLUMNS)]
+    for size in arguments.sizes:
+        first, steady = benchmark(size, arguments.ticks, arguments.interval)
+        rows.append([str(size)] + _row('first', first))
+        rows.append([str(size)] + _row('steady', _median(steady)))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
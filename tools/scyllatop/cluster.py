@@ -0,0 +1,101 @@
+import concurrent.futures
+import logging
+import exposition
+import prometheus
+import snapshot
+
+INSTANCE = 'instance'
+DC = 'dc'
+DEFAULT_PORT = 9180
+DEFAULT_WORKERS = 16
+# the tick deadline is enforced by Cluster._scrape, a slow node must still be able to answer eventually
+HTTP_TIMEOUT = 60
+
+
+def nodeUrl(address):
+    if '://' in address:
+        return address
+    if ':' not in address:
+        address = '{}:{}'.format(address, DEFAULT_PORT)
+    return 'http://{}/metrics'.format(address)
+
+
+def readNodes(fileName):
+    nodes = []
+    with open(fileName) as nodesFile:
+        for line in nodesFile:
+            fields = line.split('#', 1)[0].split()
+            if len(fields) == 0:
+                continue
+            nodes.append((fields[0], fields[1] if len(fields) > 1 else None))
+    return nodes
+
+
+class _Node(object):
+    def __init__(self, address, dc):
+        self._address = address
+        self._source = prometheus.Prometheus(nodeUrl(address), HTTP_TIMEOUT)
+        self._labels = ((INSTANCE, address),) if dc is None else ((INSTANCE, address), (DC, dc))
+        # (keys, samples, help, scrapedAt) of the last scrape, replaced as a whole so readers never mix two scrapes
+        self._state = ({}, [], {}, None)
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def state(self):
+        return self._state
+
+    def fetch(self):
+        self._source.invalidate()
+        fetched = self._source.snapshot()
+        previous = self._state[0]
+        keys = {}
+        samples = []
+        for sample in fetched.samples:
+            key = previous.get(sample.key) or sample.key.withLabels(self._labels)
+            keys[sample.key] = key
+            samples.append(exposition.Sample(key, sample.value, sample.type))
+        self._state = (keys, samples, dict(self._source.help), fetched.timestamp)
+
+
+class Cluster(object):
+    def __init__(self, nodes, timeout, workers=DEFAULT_WORKERS):
+        self._nodes = [_Node(address, dc) for address, dc in nodes]
+        self._timeout = timeout
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(self._nodes))))
+        self._pending = {}
+        self._snapshot = None
+
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self._scrape()
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _scrape(self):
+        for node in self._nodes:
+            # a node that did not answer last time is still being waited for, do not pile up requests on it
+            if node not in self._pending:
+                self._pending[node] = self._pool.submit(node.fetch)
+        done, late = concurrent.futures.wait(list(self._pending.values()), timeout=self._timeout)
+        for node, future in list(self._pending.items()):
+            if future not in done:
+                logging.warning('cluster: {} did not answer within {} seconds, keeping its last values'.format(node.address, self._timeout))
+                continue
+            del self._pending[node]
+            if future.exception() is not None:
+                logging.warning('cluster: failed scraping {}: {}'.format(node.address, future.exception()))
+        samples = []
+        times = []
+        help = {}
+        for node in self._nodes:
+            _, nodeSamples, nodeHelp, scrapedAt = node.state
+            samples.extend(nodeSamples)
+            # the last values of a late node keep their own time, so the store does not take them for new ones
+            times.extend([scrapedAt] * len(nodeSamples))
+            help.update(nodeHelp)
+        return snapshot.Snapshot(samples, help, times=times)
@@ -1,9 +1,13 @@
 import socket
 import re
 import atexit
-import os
 import parseexception
 import logging
+import instrumentation
+import exposition
+import store
+import series
+import snapshot
 
 COLLECTD_EXAMPLE_CONFIGURATION = '\n'.join(['LoadPlugin unixsock',
                                             '',
@@ -16,12 +20,17 @@ COLLECTD_EXAMPLE_CONFIGURATION = '\n'.join(['LoadPlugin unixsock',
 
 
 class Collectd(object):
-    _FIRST_LINE_PATTERN = re.compile('^(?P<lines>\d+)')
+    _FIRST_LINE_PATTERN = re.compile(r'^(?P<lines>-?\d+)')
     _METRIC_INFO_PATTERN = re.compile('^(?P<key>[^=]+)=(?P<value>.*)$')
-    _METRIC_DISCOVER_PATTERN_WITH_HELP = re.compile('[^ ]+ (?P<metric>.+)(?P<help>.*)$')
-    _METRIC_DISCOVER_PATTERN = re.compile('[^ ]+ (?P<metric>.+)(?P<help>.*)$')
+    _SHARD_PATTERN = re.compile(r'^(?P<head>[^-]+)-(?P<shard>\d+)/(?P<tail>.*)$')
+    # GETVAL commands written before their answers are read; bounded so that
+    # neither side can block on a full socket buffer while the other is writing
+    _PIPELINE_DEPTH = 512
 
     def __init__(self, socketName):
+        self._snapshot = None
+        self._keys = {}
+        self._values = {}
         try:
             self._connect(socketName)
             atexit.register(self._cleanup)
@@ -31,34 +40,107 @@ class Collectd(object):
 
     def _connect(self, socketName):
         logging.info('connecting to unix socket: {0}'.format(socketName))
-        self._socket = socket.socket(socket.SOCK_STREAM, socket.AF_UNIX)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self._socket.connect(socketName)
-        self._lineReader = os.fdopen(self._socket.fileno())
+        self._lineReader = self._socket.makefile('rb')
+        self._received = 0
 
     def query_val(self, val):
         return self.internal_query('GETVAL "{metric}"'.format(metric=val))
 
+    def query_vals(self, vals):
+        results = []
+        for start in range(0, len(vals), self._PIPELINE_DEPTH):
+            batch = vals[start:start + self._PIPELINE_DEPTH]
+            self._send(''.join('GETVAL "{metric}"\n'.format(metric=val) for val in batch))
+            results.extend(self._readLines() for _ in batch)
+        return results
+
     def query_list(self):
         return self.internal_query('LISTVAL')
 
+    def snapshot(self):
+        if self._snapshot is None:
+            # answers are parsed as they are read, so parsing is accounted as part of the fetch
+            with instrumentation.timer(instrumentation.FETCH):
+                self._snapshot = snapshot.Snapshot(self._samples())
+            instrumentation.add(instrumentation.FETCH_BYTES, self._received)
+            self._received = 0
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _samples(self):
+        listed = {}
+        for line in self.query_list():
+            fields = line.split(' ', 1)
+            if len(fields) == 2:
+                listed[fields[1].strip()] = fields[0]
+        # LISTVAL tells when every value was last updated, only the ones that moved are fetched again
+        values = {}
+        stale = []
+        for identifier, updated in listed.items():
+            known = self._values.get(identifier)
+            if known is not None and known[0] == updated:
+                values[identifier] = known
+            else:
+                stale.append(identifier)
+        for identifier, response in zip(stale, self.query_vals(stale)):
+            if response is not None:
+                values[identifier] = (listed[identifier], [self._sample(identifier, info) for info in response])
+        logging.debug('collectd: {} values listed, {} fetched'.format(len(listed), len(stale)))
+        self._values = values
+        return [sample for updated, samples in values.values() for sample in samples]
+
+    def _sample(self, identifier, line):
+        match = self._METRIC_INFO_PATTERN.search(line)
+        if match is None:
+            raise parseexception.ParseException('could not parse metric pattern from line: {0}'.format(line))
+        return exposition.Sample(self._key(identifier, match.group('key')), float(match.group('value')), self._type(identifier))
+
+    def _type(self, identifier):
+        type = identifier.rsplit('/', 1)[-1].split('-', 1)[0]
+        if type in store.COUNTER_TYPES or type.startswith('total_'):
+            return 'counter'
+        return None
+
+    def _key(self, identifier, dataSource):
+        if (identifier, dataSource) not in self._keys:
+            labels = () if dataSource == 'value' else (('ds', dataSource),)
+            symbol = series.formatSymbol(identifier, labels)
+            name = identifier
+            match = self._SHARD_PATTERN.search(identifier)
+            if match is not None:
+                name = '{}/{}'.format(match.group('head'), match.group('tail'))
+                labels += (('shard', match.group('shard')),)
+            self._keys[(identifier, dataSource)] = series.Key.intern(name, labels, symbol)
+        return self._keys[(identifier, dataSource)]
+
     def internal_query(self, command):
         self._send(command)
         return self._readLines()
 
     def _send(self, command):
-        withNewline = '{command}\n'.format(command=command)
-        octets = withNewline.encode('ascii')
-        self._socket.send(octets)
+        if not command.endswith('\n'):
+            command = '{command}\n'.format(command=command)
+        octets = command.encode('ascii')
+        self._socket.sendall(octets)
 
-    def _readLines(self):
+    def _readLine(self):
         line = self._lineReader.readline()
-        if line.strip() == '-1 No such value':
-            return None
+        self._received += len(line)
+        return line.decode('ascii')
+
+    def _readLines(self):
+        line = self._readLine()
         match = self._FIRST_LINE_PATTERN.search(line)
         if match is None:
             raise parseexception.ParseException('could not parse first line of response from collectd: {0}'.format(line))
-        howManyLines = int(match.groupdict()['lines'])
-        return [self._lineReader.readline() for _ in range(howManyLines)]
+        howManyLines = int(match.group('lines'))
+        if howManyLines < 0:
+            return None
+        return [self._readLine() for _ in range(howManyLines)]
 
     def _cleanup(self):
         self._lineReader.close()
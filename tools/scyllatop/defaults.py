@@ -12,3 +12,5 @@ DEFAULT_METRIC_PATTERNS = [
     '*memory*',
     '*cpu*',
 ]
+
+DEFAULT_HISTORY_SIZE = 16
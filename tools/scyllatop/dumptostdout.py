@@ -1,5 +1,8 @@
 import livedata
-import views.stdout
+import alerts
+import instrumentation
+import defaults
+import views.writers
 import logging
 
 
@@ -18,10 +21,16 @@ class _FakeLoop:
             self._liveData.stop()
 
 
-def dumpToStdout(metricPatterns, interval, collectd, iterations, ttl=None):
-    stdout = views.stdout.Stdout()
-    liveData = livedata.LiveData(metricPatterns, interval, collectd, ttl)
-    liveData.addView(stdout)
+def dumpToStdout(metricPatterns, interval, collectd, iterations, ttl=None, history=defaults.DEFAULT_HISTORY_SIZE, format='text', rates=False, aggregates=False, statsFile=None, thresholds=()):
+    writer = views.writers.FORMATS[format](rates=rates, aggregates=aggregates)
+    liveData = livedata.LiveData(metricPatterns, interval, collectd, ttl, history)
+    liveData.addView(writer)
+    if statsFile:
+        liveData.addView(instrumentation.StatsFile(statsFile))
+    alerting = alerts.Alerts(thresholds, stop=True)
+    if thresholds:
+        liveData.addView(alerting)
 
     loop = _FakeLoop(liveData, iterations)
     liveData.go(loop)
+    return 1 if alerting.breached else 0
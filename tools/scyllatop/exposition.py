@@ -0,0 +1,169 @@
+import codecs
+import collections
+import logging
+import parseexception
+import series
+
+_CHUNK_SIZE = 64 * 1024
+_FAMILY_SUFFIXES = ('_bucket', '_sum', '_count')
+_ESCAPES = {'\\': '\\', '"': '"', 'n': '\n'}
+
+
+class Sample(collections.namedtuple('Sample', ['key', 'value', 'type'])):
+    __slots__ = ()
+
+    @property
+    def symbol(self):
+        return self.key.symbol
+
+    @property
+    def name(self):
+        return self.key.name
+
+    @property
+    def labels(self):
+        return self.key.labels
+
+
+def _unescape(value):
+    result = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '\\' and i + 1 < len(value):
+            i += 1
+            c = _ESCAPES.get(value[i], '\\' + value[i])
+        result.append(c)
+        i += 1
+    return ''.join(result)
+
+
+def _closingQuote(text, start):
+    end = text.find('"', start)
+    if text.find('\\', start, end) < 0:
+        return end
+    i = start
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == '"':
+            return i
+        i += 1
+    return -1
+
+
+def parseLabels(text):
+    labels = []
+    pos = 0
+    while True:
+        eq = text.find('=', pos)
+        if eq < 0:
+            break
+        key = text[pos:eq].strip(' ,')
+        if text[eq + 1:eq + 2] != '"':
+            raise parseexception.ParseException('label {} is not quoted in {}'.format(key, text))
+        end = _closingQuote(text, eq + 2)
+        if end < 0:
+            raise parseexception.ParseException('unterminated label {} in {}'.format(key, text))
+        value = text[eq + 2:end]
+        if '\\' in value:
+            value = _unescape(value)
+        labels.append((key, value))
+        pos = end + 1
+    return tuple(labels)
+
+
+class Parser(object):
+    def __init__(self):
+        self._types = {}
+        self._help = {}
+        self._nameTypes = {}
+        # series text -> interned key for every series of the last pass,
+        # so known series skip the label parse on the next one
+        self._series = {}
+
+    @property
+    def types(self):
+        return self._types
+
+    @property
+    def help(self):
+        return self._help
+
+    def parse(self, stream, chunkSize=_CHUNK_SIZE):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        known = self._series
+        self._series = {}
+        pending = ''
+        while True:
+            chunk = stream.read(chunkSize)
+            text = pending + decoder.decode(chunk, not chunk)
+            start = 0
+            end = text.find('\n')
+            while end >= 0:
+                if end > start:
+                    sample = self._parseLine(text[start:end], known)
+                    if sample is not None:
+                        yield sample
+                start = end + 1
+                end = text.find('\n', start)
+            pending = text[start:]
+            if not chunk:
+                break
+        if pending.strip():
+            sample = self._parseLine(pending, known)
+            if sample is not None:
+                yield sample
+
+    def _parseLine(self, line, known):
+        if line[0] == '#':
+            self._parseComment(line)
+            return None
+        if '{' in line:
+            split = line.rfind('}') + 1
+        else:
+            split = line.find(' ')
+        if split <= 0:
+            logging.debug('exposition: skipping malformed line {}'.format(line))
+            return None
+        series = line[:split]
+        try:
+            value = float(line[split:].split(None, 1)[0])
+            key = self._series.get(series) or known.get(series) or self._parseSeries(series)
+        except (ValueError, IndexError, parseexception.ParseException) as e:
+            logging.debug('exposition: skipping malformed line {}: {}'.format(line, e))
+            return None
+        self._series[series] = key
+        name = key.name
+        if name in self._nameTypes:
+            type = self._nameTypes[name]
+        else:
+            type = self._nameTypes[name] = self._familyType(name)
+        return Sample(key, value, type)
+
+    def _parseSeries(self, text):
+        brace = text.find('{')
+        if brace < 0:
+            return series.Key.intern(text, (), text)
+        return series.Key.intern(text[:brace], parseLabels(text[brace + 1:-1]), text)
+
+    def _familyType(self, name):
+        if name in self._types:
+            return self._types[name]
+        for suffix in _FAMILY_SUFFIXES:
+            if name.endswith(suffix):
+                return self._types.get(name[:-len(suffix)])
+        return None
+
+    def _parseComment(self, line):
+        parts = line.split(None, 3)
+        if len(parts) < 3:
+            return
+        if parts[1] == 'TYPE' and len(parts) == 4:
+            type = parts[3].strip()
+            if self._types.get(parts[2]) != type:
+                self._types[parts[2]] = type
+                self._nameTypes.clear()
+        elif parts[1] == 'HELP':
+            self._help[parts[2]] = parts[3].strip() if len(parts) == 4 else ''
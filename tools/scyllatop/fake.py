@@ -1,50 +1,164 @@
-import metric
+import http.server
+import io
+import itertools
+import math
+import operator
 import os
-import random
-import collectd
-import logging
+import threading
+import time
+import numpy
+import exposition
+import series
+import snapshot
 
-
-class FakeCollectd(object):
-    def __init__(self, socketName):
-        pass
-
-    def query(self, command):
-        pass
-
-
-Metric = metric.Metric
 if 'MARK_ABSENT_PROBABILITY' in os.environ:
     MARK_ABSENT_PROBABILITY = float(os.environ['MARK_ABSENT_PROBABILITY'])
 else:
     MARK_ABSENT_PROBABILITY = 0
 
+DEFAULT_SHARDS = 4
+DEFAULT_FAMILIES = 8
+DEFAULT_TABLES = 4
+DEFAULT_HISTOGRAMS = 2
+# microseconds, doubling like the latency histograms scylla exports
+BUCKETS = tuple(640 * 2 ** i for i in range(12))
+_COUNTERS = ('reads', 'writes', 'row_hits', 'row_misses', 'sstable_reads', 'memtable_flushes', 'pending_compactions', 'tombstone_scans')
+_HISTOGRAMS = ('read_latency', 'write_latency', 'cas_read_latency', 'cas_write_latency')
+_KEYSPACE = 'ks'
+
+
+def _familyName(names, i):
+    name = names[i % len(names)]
+    if i >= len(names):
+        name = '{}_{}'.format(name, i // len(names))
+    return 'scylla_column_family_' + name
+
+
+def _header(name, type, help):
+    return '# HELP {0} {1}\n# TYPE {0} {2}\n'.format(name, help, type)
+
+
+def _prefixes(name, labelSets):
+    return [series.formatSymbol(name, labels) + ' ' for labels in labelSets]
+
+
+def _cdf(bound, median, sigma):
+    return 0.5 * math.erfc(-(math.log(bound) - math.log(median)) / (sigma * math.sqrt(2)))
+
+
+class _Block(object):
+    def __init__(self, header, prefixes, values, format=str):
+        self.header = header
+        self.prefixes = prefixes
+        self.values = values
+        self.format = format
+
+
+class Generator(object):
+    def __init__(self, shards=DEFAULT_SHARDS, families=DEFAULT_FAMILIES, tables=DEFAULT_TABLES, histograms=DEFAULT_HISTOGRAMS,
+                 buckets=BUCKETS, absent=MARK_ABSENT_PROBABILITY, seed=0):
+        self._random = numpy.random.RandomState(seed)
+        self._absent = absent
+        self._blocks = []
+        cells = [(('cf', 'table{}'.format(table)), ('ks', _KEYSPACE), ('shard', str(shard))) for table in range(tables) for shard in range(shards)]
+        for family in range(families):
+            name = _familyName(_COUNTERS, family) + '_total'
+            rates = self._random.lognormal(4, 2, len(cells))
+            self._blocks.append(_Block(_header(name, 'counter', 'synthetic counter'), _prefixes(name, cells),
+                                       lambda elapsed, rates=rates: (rates * elapsed).astype(numpy.int64)))
+        for histogram in range(histograms):
+            self._addHistogram(_familyName(_HISTOGRAMS, histogram), cells, buckets)
+        utilization = [(('shard', str(shard)),) for shard in range(shards)]
+        self._blocks.append(_Block(_header('scylla_reactor_utilization', 'gauge', 'synthetic gauge'),
+                                   _prefixes('scylla_reactor_utilization', utilization),
+                                   lambda elapsed: self._random.uniform(0, 100, len(utilization)), repr))
+
+    def _addHistogram(self, name, cells, buckets):
+        rates = self._random.lognormal(3, 2, len(cells))
+        medians = self._random.lognormal(math.log(buckets[len(buckets) // 3]), 0.5, len(cells))
+        # a fixed log-normal latency distribution per series, the bucket counts grow with it
+        fractions = numpy.array([[_cdf(bound, median, 0.8) for bound in buckets] + [1.0] for median in medians])
+        bounds = [str(bound) for bound in buckets] + ['+Inf']
+        labelSets = [cell[:2] + (('le', bound),) + cell[2:] for cell in cells for bound in bounds]
+
+        def counts(elapsed):
+            total = numpy.floor(rates * elapsed)
+            return numpy.floor(total[:, None] * fractions).astype(numpy.int64).ravel()
+
+        header = _header(name, 'histogram', 'synthetic latency histogram')
+        self._blocks.append(_Block(header, _prefixes(name + '_bucket', labelSets), counts))
+        self._blocks.append(_Block('', _prefixes(name + '_sum', cells),
+                                   lambda elapsed: (numpy.floor(rates * elapsed) * medians).astype(numpy.int64)))
+        self._blocks.append(_Block('', _prefixes(name + '_count', cells),
+                                   lambda elapsed: numpy.floor(rates * elapsed).astype(numpy.int64)))
+
+    @property
+    def size(self):
+        return sum(len(block.prefixes) for block in self._blocks)
+
+    def render(self, elapsed):
+        parts = []
+        for block in self._blocks:
+            values = map(block.format, block.values(elapsed).tolist())
+            lines = map(operator.add, block.prefixes, values)
+            if self._absent:
+                lines = itertools.compress(lines, self._random.random_sample(len(block.prefixes)) >= self._absent)
+            parts.append(block.header)
+            parts.append('\n'.join(lines))
+            parts.append('\n')
+        return ''.join(parts).encode('utf-8')
+
+
+class Fake(object):
+    def __init__(self, generator):
+        self._generator = generator
+        self._parser = exposition.Parser()
+        self._start = time.monotonic()
+        self._snapshot = None
+
+    @property
+    def help(self):
+        return self._parser.help
+
+    def snapshot(self):
+        if self._snapshot is None:
+            body = self._generator.render(time.monotonic() - self._start)
+            samples = list(self._parser.parse(io.BytesIO(body)))
+            self._snapshot = snapshot.Snapshot(samples, self._parser.help)
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
 
-class FakeMetric(Metric):
-    def update(self):
-        self._status['value'] = random.randint(0, 100000)
-        if random.random() > 1 - MARK_ABSENT_PROBABILITY:
-            self.markAbsent()
-        logging.info('{} {}'.format(self.symbol, self.status))
+class Server(object):
+    def __init__(self, port=0):
+        self.body = b''
+        server = self
 
-    @classmethod
-    def discover(self, unused):
-        results = {}
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
 
-        def _add_metric(metric, results):
-            m = FakeMetric(metric, None)
-            m.add_to_results(results)
+            def do_GET(self):
+                body = server.body
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
 
-        for cpu in range(4):
-            _add_metric('localhost/cpu-{}/cache'.format(cpu))
-            _add_metric('localhost/cpu-{}/storage_proxy'.format(cpu))
-            _add_metric('localhost/cpu-{}/transport'.format(cpu))
+            def log_message(self, format, *args):
+                pass
 
-        for x in range(100):
-            _add_metric('localhost/fake_{}/{}'.format(x, random.choice('abcdefghijklmnopqrstuvwxyz')))
-        return results
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-server')
+        self._thread.daemon = True
+        self._thread.start()
 
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/metrics'.format(self._server.server_address[1])
 
-def fake():
-    metric.Metric = FakeMetric
-    collectd.Collectd = FakeCollectd
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
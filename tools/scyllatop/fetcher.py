@@ -0,0 +1,76 @@
+import collections
+import logging
+import threading
+import time
+import instrumentation
+
+Tick = collections.namedtuple('Tick', ['snapshot', 'lag', 'missed'])
+
+
+class DoubleBuffer(object):
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def publish(self, item):
+        # there is a single writer, so the back slot can be filled without holding the lock
+        back = 1 - self._front
+        self._slots[back] = item
+        with self._condition:
+            self._front = back
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def latest(self):
+        with self._condition:
+            return self._sequence, self._slots[self._front]
+
+    def wait(self, sequence, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence != sequence, timeout)
+            return self._sequence, self._slots[self._front]
+
+
+class Fetcher(object):
+    def __init__(self, metric_source, interval, buffer):
+        self._metric_source = metric_source
+        self._interval = interval
+        self._buffer = buffer
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fetcher')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        start = time.monotonic()
+        tick = 1
+        missed = 0
+        while not self._stopped.is_set():
+            scheduled = start + tick * self._interval
+            delay = scheduled - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            try:
+                self._metric_source.invalidate()
+                snapshot = self._metric_source.snapshot()
+            except Exception:
+                logging.exception('fetcher: failed fetching metrics')
+                snapshot = None
+            instrumentation.publish(instrumentation.SCRAPE)
+            done = time.monotonic()
+            tick += 1
+            if done > start + tick * self._interval:
+                # the schedule stays anchored to the start time, ticks that were overrun are dropped
+                skipped = int((done - (start + tick * self._interval)) // self._interval) + 1
+                tick += skipped
+                missed += skipped
+                logging.debug('fetcher: fetch took {:.3f} seconds, skipped {} ticks'.format(done - scheduled, skipped))
+            if snapshot is not None:
+                self._buffer.publish(Tick(snapshot, done - scheduled, missed))
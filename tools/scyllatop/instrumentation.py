@@ -0,0 +1,76 @@
+import collections
+import contextlib
+import json
+import threading
+import time
+
+FETCH = 'fetch'
+FETCH_BYTES = 'fetch bytes'
+PARSE = 'parse'
+DISCOVERY = 'discovery'
+UPDATE = 'update'
+RENDER = 'render'
+# what the fetcher thread measures, published once per scrape
+SCRAPE = (FETCH, FETCH_BYTES, PARSE)
+# what the main loop measures, published once per tick
+LOOP = (DISCOVERY, UPDATE, RENDER)
+
+_lock = threading.Lock()
+_pending = collections.Counter()
+_last = {}
+
+
+def add(name, amount):
+    with _lock:
+        _pending[name] += amount
+
+
+@contextlib.contextmanager
+def timer(name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        add(name, time.monotonic() - start)
+
+
+def publish(names):
+    with _lock:
+        for name in names:
+            _last[name] = _pending.pop(name, 0)
+
+
+def last():
+    with _lock:
+        return dict(_last)
+
+
+def _milliseconds(seconds):
+    return '{:.0f}ms'.format(seconds * 1000)
+
+
+def _size(octets):
+    for divisor, suffix in ((1 << 20, 'MB'), (1 << 10, 'kB')):
+        if octets >= divisor:
+            return '{:.1f}{}'.format(octets / float(divisor), suffix)
+    return '{}B'.format(octets)
+
+
+def summary():
+    values = last()
+    if not values:
+        return None
+    parts = ['{} {}'.format(name, _milliseconds(values[name])) for name in (FETCH, PARSE, DISCOVERY, UPDATE, RENDER) if name in values]
+    if FETCH_BYTES in values:
+        parts.insert(1, _size(values[FETCH_BYTES]))
+    return ' | '.join(parts)
+
+
+class StatsFile(object):
+    def __init__(self, fileName):
+        self._file = open(fileName, 'a')
+
+    def update(self, liveData):
+        record = dict(last(), timestamp=round(time.time(), 3), measurements=len(liveData.measurements))
+        self._file.write(json.dumps(record, sort_keys=True) + '\n')
+        self._file.flush()
@@ -1,26 +1,37 @@
+import heapq
+import itertools
 import logging
-import parseexception
-import fnmatch
+import instrumentation
 import time
 import metric
 import defaults
+import store
+import fetcher
+import matcher
 
 
 class LiveData(object):
-    def __init__(self, metricPatterns, interval, metric_source, ttl=None):
+    def __init__(self, metricPatterns, interval, metric_source, ttl=None, history=defaults.DEFAULT_HISTORY_SIZE):
         logging.info('will query metric_source {} every {} seconds'.format(metric_source, interval))
         if ttl:
             logging.info('absent data will be kept for {} seconds'.format(ttl))
         self._startedAt = time.time()
         self._results = {}
+        self._store = store.Store(history)
+        self._generation = 0
         self._interval = interval
         self._ttl = ttl
         self._metric_source = metric_source
         if metricPatterns and len(metricPatterns) > 0:
-            self._metricPatterns = metricPatterns
+            self._matcher = matcher.Matcher(metricPatterns)
         else:
-            self._metricPatterns = defaults.DEFAULT_METRIC_PATTERNS
-        self._results = self._discoverMetrics()
+            self._matcher = matcher.Matcher(defaults.DEFAULT_METRIC_PATTERNS)
+        self._buffer = fetcher.DoubleBuffer()
+        self._fetcher = fetcher.Fetcher(metric_source, interval, self._buffer)
+        self._expirations = []
+        self._sequence = itertools.count()
+        self._tick = fetcher.Tick(metric_source.snapshot(), 0, 0)
+        self._present = self._discoverMetrics(self._tick.snapshot)
         self._views = []
         self._stop = False
 
@@ -36,60 +47,118 @@ class LiveData(object):
     def measurements(self):
         return self._results.values()
 
-    def _discoverMetrics(self):
-        results = metric.Metric.discover(self._metric_source)
-        logging.debug('_discoverMetrics: {} results discovered'.format(len(results)))
-        for symbol in results:
-            if not self._matches(symbol, self._metricPatterns):
-                results.pop(symbol)
-        logging.debug('_initializeMetrics: {} results matched'.format(len(results)))
-        return results
-
-    def _matches(self, symbol, metricPatterns):
-        for pattern in metricPatterns:
-            match = fnmatch.fnmatch(symbol, pattern)
-            if match:
-                return True
-        return False
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def wallclock(self):
+        return self._tick.snapshot.wallclock
+
+    @property
+    def lag(self):
+        return self._tick.lag
+
+    @property
+    def missed(self):
+        return self._tick.missed
+
+    def _discoverMetrics(self, snapshot):
+        self._store.beginTick(snapshot.timestamp)
+        present = set()
+        rows = []
+        values = []
+        times = [] if snapshot.times is not None else None
+        for i, sample in enumerate(snapshot.samples):
+            metric_obj = self._results.get(sample.key)
+            if metric_obj is None:
+                if not self._matcher.matches(sample.key):
+                    continue
+                metric_obj = metric.Metric(sample.key, '', sample.type)
+                metric_obj.attach(self._store)
+                self._results[sample.key] = metric_obj
+                self._generation += 1
+            present.add(sample.key)
+            rows.append(metric_obj.row)
+            values.append(sample.value)
+            if times is not None:
+                times.append(snapshot.times[i])
+        self._store.write(rows, values, times)
+        self._store.endTick()
+        logging.debug('_discoverMetrics: {} of {} results matched'.format(len(present), len(snapshot.samples)))
+        return present
+
+    def _track(self, present, now):
+        appeared = present - self._present
+        disappeared = self._present - present
+        self._present = present
+        for key in appeared:
+            self._results[key].markPresent()
+        expiration = now + self._ttl if self._ttl else None
+        for key in disappeared:
+            metric_obj = self._results[key]
+            metric_obj.markAbsent(expiration)
+            if expiration is not None:
+                heapq.heappush(self._expirations, (expiration, next(self._sequence), key))
+        expired = 0
+        while self._expirations and self._expirations[0][0] <= now:
+            expiration, _, key = heapq.heappop(self._expirations)
+            metric_obj = self._results.get(key)
+            # entries of series that came back (and maybe left again) since are stale
+            if metric_obj is None or not metric_obj.is_absent or metric_obj.expiration != expiration:
+                continue
+            del self._results[key]
+            metric_obj.detach()
+            self._generation += 1
+            expired += 1
+        logging.debug('go: {} measurements present, {} appeared, {} disappeared, {} expired'.format(len(present), len(appeared), len(disappeared), expired))
 
     def go(self, mainLoop):
-        num_updated = 0
-        num_absent = 0
-        num_expired = 0
-        num_added = 0
-        now = time.time()
+        sequence = 0
+        self._fetcher.start()
         while not self._stop:
-            new_results = self._discoverMetrics();
-            expiration = time.time() + self._ttl if self._ttl else None
-            for metric in self._results:
-                if not metric in new_results:
-                    metric_obj = self._results[metric]
-                    if not metric_obj.is_absent:
-                        metric_obj.markAbsent(expiration)
-                        num_absent += 1
-                    elif metric_obj.expiration and now >= metric_obj.expiration:
-                        self._results.pop(metric)
-                        num_expired += 1
-                    else:
-                        num_absent += 1
-            num_updated = len(self._results) - num_absent
-            num_added = len(new_results) - num_updated
-            self._results.update(new_results)
-            logging.debug('go: updated {} measurements, added {}, {} marked absent, {} expired'.format(num_updated, num_added, num_absent, num_expired))
-
-            for view in self._views:
-                logging.debug('go: updating view {}'.format(view))
-                view.update(self)
-            logging.debug('go: sleeping for {} seconds'.format(self._interval))
-            time.sleep(self._interval)
+            instrumentation.publish(instrumentation.LOOP)
+            with instrumentation.timer(instrumentation.UPDATE):
+                for view in self._views:
+                    logging.debug('go: updating view {}'.format(view))
+                    view.update(self)
             logging.debug('go: drawing screen...')
-            mainLoop.draw_screen()
+            with instrumentation.timer(instrumentation.RENDER):
+                mainLoop.draw_screen()
+            if self._stop:
+                break
+            logging.debug('go: waiting for the next snapshot')
+            tick = self._next(sequence)
+            if tick is None:
+                break
+            sequence, tick = tick
+            self.advance(tick)
+        self._fetcher.stop()
+
+    def _next(self, sequence):
+        while not self._stop:
+            latest, tick = self._buffer.wait(sequence, self._interval)
+            if latest == sequence:
+                continue
+            sequence = latest
+            if tick.snapshot is not self._tick.snapshot:
+                return sequence, tick
+            # an unchanged snapshot is not a new tick, unless the source has nothing more to give
+            if getattr(self._metric_source, 'finished', False):
+                logging.info('go: the metric source is finished')
+                self._stop = True
+        return None
 
-    def _update(self, metric_obj):
-        try:
-            metric_obj.update()
-        except parseexception.ParseException:
-            logging.exception('exception while updating metric {0}'.format(metric_obj))
+    def advance(self, tick):
+        self._tick = tick
+        with instrumentation.timer(instrumentation.DISCOVERY):
+            # expirations follow the snapshot clock, which is the recorded time of the tick when replaying
+            self._track(self._discoverMetrics(tick.snapshot), tick.snapshot.timestamp)
 
     def stop(self):
         self._stop = True
+        self._fetcher.stop()
@@ -0,0 +1,24 @@
+import fnmatch
+import re
+import weakref
+
+
+class Matcher(object):
+    def __init__(self, patterns):
+        self._patterns = list(patterns)
+        combined = '|'.join('(?:{})'.format(fnmatch.translate(pattern)) for pattern in self._patterns)
+        self._regex = re.compile(combined or '(?!)')
+        self._decisions = weakref.WeakKeyDictionary()
+
+    @property
+    def patterns(self):
+        return self._patterns
+
+    def matchesSymbol(self, symbol):
+        return self._regex.match(symbol) is not None
+
+    def matches(self, key):
+        decision = self._decisions.get(key)
+        if decision is None:
+            decision = self._decisions[key] = self.matchesSymbol(key.symbol)
+        return decision
@@ -1,27 +1,60 @@
 import logging
-import parseexception
+import store
 
 
 class Metric(object):
-    def __init__(self, symbol, metric_source, hlp):
-        self._symbol = symbol
-        self._metric_source = metric_source
-        self._status = {}
+    def __init__(self, key, hlp, type=None):
+        self._key = key
         self._help_line = hlp
+        self._type = type
+        self._store = None
+        self._row = None
         self._expiration = None
         self._absent = False
 
+    @property
+    def key(self):
+        return self._key
+
     @property
     def symbol(self):
-        return self._symbol
+        return self._key.symbol
 
     @property
     def help(self):
         return self._help_line
 
+    @property
+    def type(self):
+        return self._type
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def value(self):
+        if self._store is None:
+            return None
+        return self._store.value(self._row)
+
     @property
     def status(self):
-        return self._status
+        if self._store is None:
+            return {}
+        if self._absent:
+            return {'value': 'not available'}
+        return {'value': self.value}
+
+    @property
+    def is_counter(self):
+        return store.isCounter(self._type) or store.isCounter(self._key.label('type'))
+
+    @property
+    def rate(self):
+        if self._store is None or self._absent or not self.is_counter:
+            return None
+        return self._store.rates()[self._row]
 
     @property
     def is_absent(self):
@@ -31,51 +64,38 @@ class Metric(object):
     def expiration(self):
         return self._expiration
 
-    def update_info(self, line):
-        match = self._metric_source._METRIC_INFO_PATTERN.search(line)
-        if match is None:
-            raise parseexception.ParseException('could not parse metric pattern from line: {0}'.format(line))
-        key = match.groupdict()['key']
-        value = match.groupdict()['value']
-        self._status[key] = value
-
-    def update(self):
-        response = self._metric_source.query_val(self._symbol)
-        if response is None:
-            self.markAbsent()
-            return
-        for line in response:
-            self.update_info(line)
-            logging.debug('update {}: {}'.format(self.symbol, line.strip()))
+    def attach(self, store):
+        self._store = store
+        self._row = store.allocate(self.is_counter)
+
+    def detach(self):
+        if self._store is not None:
+            self._store.release(self._row)
+        self._store = None
+        self._row = None
+
+    def markPresent(self):
+        self._absent = False
+        self._expiration = None
 
     def markAbsent(self, expiration=None):
-        for key in list(self._status.keys()):
-            self._status[key] = 'not available'
         self._absent = True
         self._expiration = expiration
 
     def add_to_results(self, results):
         if not isinstance(results, dict):
             raise Exception("results must be a dictionary")
-        results[self._symbol] = self
+        results[self._key] = self
+
     @classmethod
-    def _discover(cls, metric_source, with_help = False):
+    def _discover(cls, metric_source, with_help=False):
         results = {}
         logging.info('discovering metrics{}...'.format(" with help" if with_help else ""))
-        response = metric_source.query_list()
-        for line in response:
-            if with_help:
-                pattern = metric_source._METRIC_DISCOVER_PATTERN_WITH_HELP
-            else:
-                pattern = metric_source._METRIC_DISCOVER_PATTERN
-            match = pattern.search(line)
-            if match:
-                metric = match.groupdict()['metric']
-                hlp = match.groupdict()['help'] if with_help else ""
-                m = Metric(metric, metric_source, hlp)
-                m.update_info(line)
-                m.add_to_results(results)
-                logging.debug('discover: {}'.format(m))
+        snapshot = metric_source.snapshot()
+        for sample in snapshot.samples:
+            hlp = snapshot.help(sample.name) if with_help else ""
+            m = cls(sample.key, hlp, sample.type)
+            m.add_to_results(results)
 
         logging.info('found {} metrics'.format(len(results)))
         return results
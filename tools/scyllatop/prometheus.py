@@ -1,24 +1,141 @@
-import urllib.request, urllib.error, urllib.parse
-import re
+import http.client
+import urllib.parse
+import time
+import zlib
+import logging
+import instrumentation
+import exposition
+import snapshot
+
+
+class _CountingStream(object):
+    def __init__(self, response):
+        self._response = response
+        self.octets = 0
+        self.seconds = 0.0
+
+    def read(self, size):
+        start = time.monotonic()
+        data = self._response.read(size)
+        self.seconds += time.monotonic() - start
+        self.octets += len(data)
+        return data
+
+
+class _GzipStream(object):
+    def __init__(self, response):
+        self._response = response
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._done = False
+
+    def read(self, size):
+        while not self._done:
+            compressed = self._response.read(size)
+            if not compressed:
+                self._done = True
+                return self._decompressor.flush()
+            data = self._decompressor.decompress(compressed)
+            if data:
+                return data
+        return b''
 
 
 class Prometheus(object):
-    _FIRST_LINE_PATTERN = re.compile('^(?P<lines>\d+)')
-    _METRIC_INFO_PATTERN = re.compile('^(?P<key>.+) (?P<value>[^ ]+)[ ]*$')
-    _METRIC_DISCOVER_PATTERN = re.compile('^(?P<metric>[^#].+) (?P<value>[^ ]+)[ ]*$')
-    _METRIC_DISCOVER_PATTERN_WITH_HELP = re.compile('^# HELP (?P<metric>[^ ]+)(?P<help>.*)$')
+    _HEADERS = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
 
-    def __init__(self, host):
+    def __init__(self, host, timeout=None):
         self._host = host
+        self._timeout = timeout
+        url = urllib.parse.urlsplit(host)
+        self._secure = url.scheme == 'https'
+        self._netloc = url.netloc
+        self._path = url.path or '/'
+        if url.query:
+            self._path += '?' + url.query
+        self._connection = None
+        self._validators = {}
+        self._samples = None
+        self._parser = exposition.Parser()
+        self._snapshot = None
 
-    def read_metrics(self):
-        return urllib.request.urlopen(self._host).read().decode('utf-8').splitlines()
+    @property
+    def help(self):
+        return self._parser.help
+
+    def _connect(self):
+        logging.info('connecting to {}'.format(self._host))
+        if self._secure:
+            return http.client.HTTPSConnection(self._netloc, timeout=self._timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self._timeout)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
 
-    def get_metrics(self):
-        return self.read_metrics()
+    def _request(self):
+        headers = dict(self._HEADERS)
+        if self._samples is not None:
+            headers.update(self._validators)
+        fresh = self._connection is None
+        if fresh:
+            self._connection = self._connect()
+        try:
+            self._connection.request('GET', self._path, headers=headers)
+            return self._connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            self._close()
+            if fresh:
+                raise
+        # the server may drop an idle keep-alive connection, retry once on a new one
+        logging.debug('reconnecting to {}'.format(self._host))
+        self._connection = self._connect()
+        self._connection.request('GET', self._path, headers=headers)
+        return self._connection.getresponse()
+
+    def read_metrics(self):
+        start = time.monotonic()
+        try:
+            response = self._request()
+        except Exception:
+            self._close()
+            raise
+        requested = time.monotonic()
+        try:
+            if response.status == http.client.NOT_MODIFIED:
+                response.read()
+                instrumentation.add(instrumentation.FETCH, time.monotonic() - start)
+                logging.debug('{} has not changed, reusing the last exposition'.format(self._host))
+                return self._samples
+            if response.status != http.client.OK:
+                response.read()
+                raise IOError('{} answered {} {}'.format(self._host, response.status, response.reason))
+            self._validators = {}
+            if response.getheader('ETag'):
+                self._validators['If-None-Match'] = response.getheader('ETag')
+            if response.getheader('Last-Modified'):
+                self._validators['If-Modified-Since'] = response.getheader('Last-Modified')
+            counted = stream = _CountingStream(response)
+            if response.getheader('Content-Encoding', '').lower() == 'gzip':
+                stream = _GzipStream(counted)
+            self._samples = list(self._parser.parse(stream))
+            # reading and parsing are interleaved, whatever was not spent waiting for the socket went to parsing
+            instrumentation.add(instrumentation.FETCH, requested - start + counted.seconds)
+            instrumentation.add(instrumentation.FETCH_BYTES, counted.octets)
+            instrumentation.add(instrumentation.PARSE, time.monotonic() - requested - counted.seconds)
+            return self._samples
+        except Exception:
+            self._close()
+            raise
+        finally:
+            if response.will_close:
+                self._close()
 
-    def query_val(self, val):
-        return [l for l in self.get_metrics() if (not l.startswith('#')) and (val == "" or re.match(val, l))]
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = snapshot.Snapshot(self.read_metrics(), self._parser.help)
+            logging.debug('snapshot: {} values fetched from {}'.format(len(self._snapshot.samples), self._host))
+        return self._snapshot
 
-    def query_list(self):
-        return self.get_metrics()
+    def invalidate(self):
+        self._snapshot = None
@@ -0,0 +1,174 @@
+import bisect
+import json
+import logging
+import mmap
+import struct
+import time
+import zlib
+import numpy
+import instrumentation
+import exposition
+import series
+import snapshot
+
+# A recording is a magic header followed by records, each one a kind byte and
+# a payload length. 'D' records append series to the symbol dictionary, 'T'
+# records hold one tick: the wall clock time, the dictionary size at that
+# point and the value of every series as float64 bit patterns XORed with the
+# previous tick (so unchanged values are zero words), zlib compressed. Every
+# KEYFRAME_INTERVAL ticks a tick is stored against zeros so a seek never has
+# to decode more than that many ticks.
+MAGIC = b'SCYTOP01'
+KEYFRAME_INTERVAL = 64
+_RECORD = struct.Struct('<cI')
+_TICK = struct.Struct('<dI?')
+_DICTIONARY = b'D'
+_TICK_KIND = b'T'
+
+
+class Recorder(object):
+    def __init__(self, metric_source, fileName):
+        self._metric_source = metric_source
+        self._file = open(fileName, 'wb')
+        self._file.write(MAGIC)
+        self._ids = {}
+        self._previous = numpy.zeros(0, dtype='<u8')
+        self._ticks = 0
+        self._recorded = None
+
+    def snapshot(self):
+        current = self._metric_source.snapshot()
+        if current is not self._recorded:
+            self._record(current)
+            self._recorded = current
+        return current
+
+    def invalidate(self):
+        self._metric_source.invalidate()
+
+    def close(self):
+        self._file.close()
+
+    def _record(self, current):
+        added = []
+        ids = []
+        for sample in current.samples:
+            id = self._ids.get(sample.key)
+            if id is None:
+                id = self._ids[sample.key] = len(self._ids)
+                added.append([sample.key.name, sample.key.labels, sample.type, sample.key.symbol])
+            ids.append(id)
+        if added:
+            self._write(_DICTIONARY, json.dumps(added).encode('utf-8'))
+        values = numpy.full(len(self._ids), numpy.nan)
+        values[ids] = [sample.value for sample in current.samples]
+        bits = values.view('<u8')
+        keyframe = self._ticks % KEYFRAME_INTERVAL == 0
+        encoded = bits.copy()
+        if not keyframe:
+            encoded[:len(self._previous)] ^= self._previous
+        self._write(_TICK_KIND, _TICK.pack(current.wallclock, len(bits), keyframe) + zlib.compress(encoded.tobytes(), 1))
+        self._file.flush()
+        self._previous = bits
+        self._ticks += 1
+
+    def _write(self, kind, payload):
+        self._file.write(_RECORD.pack(kind, len(payload)))
+        self._file.write(payload)
+
+
+class Replay(object):
+    def __init__(self, fileName, speed=1.0, start=0.0):
+        self._file = open(fileName, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise IOError('{} is not a scyllatop recording'.format(fileName))
+        self._keys = []
+        self._types = []
+        self._times = []
+        self._offsets = []
+        self._keyframes = []
+        self._index()
+        if len(self._times) == 0:
+            raise IOError('{} does not hold any tick'.format(fileName))
+        logging.info('replay: {} ticks and {} series over {:.1f} seconds in {}'.format(
+            len(self._times), len(self._keys), self._times[-1] - self._times[0], fileName))
+        self._speed = speed
+        self._origin = self._times[0] + start
+        self._startedAt = None
+        self._position = None
+        self._values = None
+        self._current = None
+        self._snapshot = None
+
+    def _index(self):
+        offset = len(MAGIC)
+        while offset + _RECORD.size <= len(self._map):
+            kind, length = _RECORD.unpack_from(self._map, offset)
+            payload = offset + _RECORD.size
+            if payload + length > len(self._map):
+                logging.warning('replay: ignoring a truncated record at the end of the recording')
+                break
+            if kind == _DICTIONARY:
+                for name, labels, type, symbol in json.loads(self._map[payload:payload + length].decode('utf-8')):
+                    self._keys.append(series.Key.intern(name, [tuple(label) for label in labels], symbol))
+                    self._types.append(type)
+            elif kind == _TICK_KIND:
+                timestamp, width, keyframe = _TICK.unpack_from(self._map, payload)
+                self._times.append(timestamp)
+                self._offsets.append((payload, length))
+                if keyframe:
+                    self._keyframes.append(len(self._times) - 1)
+            offset = payload + length
+
+    @property
+    def duration(self):
+        return self._times[-1] - self._times[0]
+
+    @property
+    def finished(self):
+        return self._position == len(self._times) - 1
+
+    def seek(self, timestamp):
+        return max(bisect.bisect_right(self._times, timestamp) - 1, 0)
+
+    def tick(self, position):
+        if self._position is None or position < self._position or position - self._position > KEYFRAME_INTERVAL:
+            first = self._keyframes[bisect.bisect_right(self._keyframes, position) - 1]
+            self._values = None
+        else:
+            first = self._position + 1
+        for i in range(first, position + 1):
+            self._decode(i)
+        self._position = position
+        values = self._values.view('<f8')
+        present = numpy.flatnonzero(~numpy.isnan(values))
+        samples = [exposition.Sample(self._keys[i], value, self._types[i]) for i, value in zip(present.tolist(), values[present].tolist())]
+        return snapshot.Snapshot(samples, timestamp=self._times[position], wallclock=self._times[position])
+
+    def _decode(self, position):
+        payload, length = self._offsets[position]
+        timestamp, width, keyframe = _TICK.unpack_from(self._map, payload)
+        body = self._map[payload + _TICK.size:payload + length]
+        bits = numpy.frombuffer(zlib.decompress(body), dtype='<u8').copy()
+        if not keyframe:
+            bits[:len(self._values)] ^= self._values
+        self._values = bits
+
+    def snapshot(self):
+        if self._snapshot is None:
+            now = time.monotonic()
+            if self._startedAt is None:
+                self._startedAt = now
+            position = self.seek(self._origin + (now - self._startedAt) * self._speed)
+            if position != self._position:
+                # when replaying slower than recorded, the same tick is handed out again as is
+                with instrumentation.timer(instrumentation.PARSE):
+                    self._current = self.tick(position)
+                if position == len(self._times) - 1:
+                    logging.info('replay: reached the end of the recording')
+            self._snapshot = self._current
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
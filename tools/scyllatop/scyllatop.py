@@ -8,16 +8,36 @@ import pprint
 import logging
 import collectd
 import prometheus
+import cluster
+import recording
 import metric
 import fake
 import livedata
+import alerts
+import parseexception
+import instrumentation
 import views.simple
 import views.aggregate
+import views.rate
+import views.histogram
+import views.heatmap
+import views.top
+import views.writers
+import views.anomalies
+import views.groups
 import userinput
 import dumptostdout
+import defaults
 import urwid
 
 
+def threshold(text):
+    try:
+        return alerts.parseThreshold(text)
+    except parseexception.ParseException as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def shell():
     try:
         import IPython
@@ -26,20 +46,34 @@ def shell():
         logging.error('shell mode requires IPython to be installed')
 
 
-def fancyUserInterface(metricPatterns, interval, metric_source, ttl):
+def fancyUserInterface(metricPatterns, interval, metric_source, ttl, history, clusterViews=False, statsFile=None, thresholds=(), sigma=views.anomalies.DEFAULT_SIGMA):
     aggregateView = views.aggregate.Aggregate()
     simpleView = views.simple.Simple()
+    rateView = views.rate.Rate()
+    shardRateView = views.rate.Rate(over=())
+    histogramView = views.histogram.Histogram()
+    heatmapView = views.heatmap.Heatmap(node=cluster.INSTANCE, over=(cluster.DC,))
+    topView = views.top.Top()
+    anomaliesView = views.anomalies.Anomalies(sigma)
     userInput = userinput.UserInput()
-    loop = urwid.MainLoop(aggregateView.widget(), unhandled_input=userInput)
+    loop = urwid.MainLoop(aggregateView.widget(), palette=views.heatmap.PALETTE, unhandled_input=userInput)
     userInput.setLoop(loop)
-    userInput.setMap(M=aggregateView, S=simpleView)
+    viewMap = dict(M=aggregateView, S=simpleView, R=rateView, P=shardRateView, H=histogramView, T=heatmapView, N=topView, A=anomaliesView)
+    if clusterViews:
+        viewMap['D'] = views.aggregate.Aggregate(over=(views.groups.SHARD, cluster.INSTANCE))
+        viewMap['C'] = views.aggregate.Aggregate(over=(views.groups.SHARD, cluster.INSTANCE, cluster.DC))
+    userInput.setMap(**viewMap)
     try:
-        liveData = livedata.LiveData(metricPatterns, interval, metric_source, ttl)
+        liveData = livedata.LiveData(metricPatterns, interval, metric_source, ttl, history)
     except Exception as inst:
         print("scyllatop failed connecting to Scylla With an error: {error}".format(error=inst))
         sys.exit(1)
-    liveData.addView(simpleView)
-    liveData.addView(aggregateView)
+    for view in viewMap.values():
+        liveData.addView(view)
+    if statsFile:
+        liveData.addView(instrumentation.StatsFile(statsFile))
+    if thresholds:
+        liveData.addView(alerts.Alerts(thresholds, bell=alerts.terminalBell(loop)))
     liveDataThread = threading.Thread(target=lambda: liveData.go(loop))
     liveDataThread.daemon = True
     liveDataThread.start()
@@ -51,7 +85,12 @@ def fancyUserInterface(metricPatterns, interval, metric_source, ttl):
 
 if __name__ == '__main__':
     description = '\n'.join(['A top-like tool for scylladb collectd/prometheus metrics.',
-                             'Keyboard shortcuts: S - simple view, M - aggregate over multiple cores, Q -quits',
+                             'Keyboard shortcuts: S - simple view, M - aggregate over multiple cores, R - counter rates over multiple cores,',
+                             'P - counter rates per core, H - latency histogram percentiles per node and core,',
+                             'T - hot-shard heatmap of counter rates ([ and ] pick the metric family, + and - the number of highlighted outliers),',
+                             'N - top metrics (1, 2 and 3 sort by rate, value or change since start, / filters by regex),',
+                             'A - counter rates deviating from their moving average (+ and - change the limit), D - aggregate per data center and C - aggregate over the cluster',
+                             '(with --nodes or --nodes-file), Q -quits',
                              '',
                              'By default it would work with the Prometheus API and does not require configuration.',
                              'For collectd, you need to configure the unix-sock plugin for collectd'
@@ -68,6 +107,14 @@ if __name__ == '__main__':
     parser.add_argument('-i', '--interval', help="time resolution in seconds, default: 1", type=float, default=1)
     parser.add_argument('-s', '--socket', default='/var/run/collectd-unixsock', help="unixsock plugin to connect to, default: /var/run/collectd-unixsock")
     parser.add_argument('-p', '--prometheus-address', default='http://localhost:9180/metrics', help="The prometheus end-point")
+    parser.add_argument('-N', '--nodes', nargs='+', default=[], help="scrape several nodes concurrently, given as host[:port] or full URLs. Every metric gets an instance label")
+    parser.add_argument('--nodes-file', help="read the nodes to scrape from a file, one 'host[:port] [dc]' per line")
+    parser.add_argument('--scrape-timeout', type=float, default=None, help="in multi-node mode, how long to wait for a node before showing its last values, default: the interval")
+    parser.add_argument('--scrape-workers', type=int, default=cluster.DEFAULT_WORKERS, help="in multi-node mode, how many nodes are scraped in parallel, default: {}".format(cluster.DEFAULT_WORKERS))
+    parser.add_argument('--record', metavar='FILE', help="append every scraped snapshot to a compact recording in FILE")
+    parser.add_argument('--replay', metavar='FILE', help="drive the views from a recording made with --record instead of a live node")
+    parser.add_argument('--replay-speed', type=float, default=1.0, help="replay speed factor, e.g. 10 replays ten recorded seconds every second, default: 1")
+    parser.add_argument('--replay-start', type=float, default=0.0, help="start the replay this many seconds into the recording, default: 0")
     parser.add_argument('--print-config', action='store_true',
                         help="print out a configuration to put in your collectd.conf (you can use -s here to define the socket path)")
     parser.add_argument('-l', '--list', action='store_true',
@@ -77,10 +124,23 @@ if __name__ == '__main__':
     parser.add_argument('-L', '--logfile', default='scyllatop.log',
                         help="specify path for log file")
     parser.add_argument('-S', '--shell', action='store_true', help="uses IPython to enter a debug shell, usefull for development")
-    parser.add_argument('-F', '--fake', action='store_true', help="fake metric updates - this is for developers only")
+    parser.add_argument('-F', '--fake', action='store_true', help="show a synthetic exposition of counters and latency histograms instead of a live node - this is for developers only")
+    parser.add_argument('--fake-shards', type=int, default=fake.DEFAULT_SHARDS, help="with --fake, the number of shards (default={})".format(fake.DEFAULT_SHARDS))
+    parser.add_argument('--fake-families', type=int, default=fake.DEFAULT_FAMILIES, help="with --fake, the number of counter families per table (default={})".format(fake.DEFAULT_FAMILIES))
+    parser.add_argument('--fake-tables', type=int, default=fake.DEFAULT_TABLES, help="with --fake, the number of tables (default={})".format(fake.DEFAULT_TABLES))
     parser.add_argument('-n', '--iterations', type=int, default=None, help="Exit after a given number of iterations. This is only relevant if output is redirected")
     parser.add_argument('-b', '--batch', action='store_true', help="batch mode - dump metrics to stdout instead of using an interactive user session")
+    parser.add_argument('--format', choices=sorted(views.writers.FORMATS), default='text', help="batch mode output format, one record per tick for jsonl, csv and prom; csv keeps the columns of the first tick (default=text)")
+    parser.add_argument('--rates', action='store_true', help="batch mode - also write the per second rate of every counter, as <name>:rate")
+    parser.add_argument('--aggregates', action='store_true', help="batch mode - also write avg/tot/min/max/p99 over shards, as <name>:<statistic>")
+    parser.add_argument('--stats-file', metavar='FILE', help="append scyllatop's own fetch, parse, discovery, update and render timings to FILE, one JSON line per tick")
+    parser.add_argument('--sigma', type=float, default=views.anomalies.DEFAULT_SIGMA, help="how many standard deviations from its moving average make a counter rate anomalous (default={})".format(views.anomalies.DEFAULT_SIGMA))
+    parser.add_argument('--alert', dest='thresholds', metavar='THRESHOLD', type=threshold, action='append', default=[],
+                        help="ring the terminal bell, or in batch mode exit with status 1, when a metric crosses a threshold. "
+                             "GLOB>LIMIT and GLOB<LIMIT compare values, a /s suffix compares counter rates and GLOB>Ksigma "
+                             "deviations from the moving average, e.g. --alert '*reactor_utilization*>95' --alert '*reads*>4sigma'. Can be repeated")
     parser.add_argument('-t', '--ttl', type=int, default=60, help="Keep absent metrics for ttl seconds (default=60)")
+    parser.add_argument('--history', type=int, default=defaults.DEFAULT_HISTORY_SIZE, help="number of samples kept per metric (default={})".format(defaults.DEFAULT_HISTORY_SIZE))
     arguments = parser.parse_args()
     stream_log = logging.StreamHandler()
     stream_log.setLevel(logging.ERROR)
@@ -101,24 +161,37 @@ if __name__ == '__main__':
         print(collectd.COLLECTD_EXAMPLE_CONFIGURATION.format(socket=arguments.socket))
         quit()
 
-    if arguments.fake:
-        fake.fake()
-    if arguments.collectd:
+    nodes = [(node, None) for node in arguments.nodes]
+    if arguments.nodes_file:
+        nodes += cluster.readNodes(arguments.nodes_file)
+    if arguments.replay:
+        metric_source = recording.Replay(arguments.replay, arguments.replay_speed, arguments.replay_start)
+    elif arguments.fake:
+        metric_source = fake.Fake(fake.Generator(arguments.fake_shards, arguments.fake_families, arguments.fake_tables))
+    elif arguments.collectd:
         metric_source = collectd.Collectd(arguments.socket)
+    elif nodes:
+        timeout = arguments.scrape_timeout if arguments.scrape_timeout is not None else arguments.interval
+        metric_source = cluster.Cluster(nodes, timeout, arguments.scrape_workers)
     else:
         metric_source = prometheus.Prometheus(arguments.prometheus_address)
+    if arguments.record:
+        metric_source = recording.Recorder(metric_source, arguments.record)
     if arguments.shell:
         shell()
         quit()
     if arguments.list:
-        pprint.pprint([m.symbol + m.help for m in metric.Metric.discover_with_help(metric_source).values()])
+        pprint.pprint(['{} {}'.format(m.symbol, m.help) for m in metric.Metric.discover_with_help(metric_source).values()])
         quit()
 
     logging.debug('arguments={} isatty={}'.format(arguments, sys.stdout.isatty()))
     try:
         if not sys.stdout.isatty() or arguments.batch:
-            dumptostdout.dumpToStdout(arguments.metricPattern, arguments.interval, metric_source, arguments.iterations, arguments.ttl)
+            status = dumptostdout.dumpToStdout(arguments.metricPattern, arguments.interval, metric_source, arguments.iterations, arguments.ttl, arguments.history,
+                                               arguments.format, arguments.rates, arguments.aggregates, arguments.stats_file, arguments.thresholds)
+            sys.exit(status)
         else:
-            fancyUserInterface(arguments.metricPattern, arguments.interval, metric_source, arguments.ttl)
+            fancyUserInterface(arguments.metricPattern, arguments.interval, metric_source, arguments.ttl, arguments.history, len(nodes) > 0,
+                               arguments.stats_file, arguments.thresholds, arguments.sigma)
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,65 @@
+import threading
+import weakref
+
+
+def formatSymbol(name, labels):
+    if not labels:
+        return name
+    return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(key, _escape(value)) for key, value in labels))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Key(object):
+    __slots__ = ('_name', '_labels', '_symbol', '_without', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+    _lock = threading.Lock()
+
+    def __init__(self, name, labels, symbol):
+        self._name = name
+        self._labels = labels
+        self._symbol = symbol
+        self._without = {}
+
+    @classmethod
+    def intern(cls, name, labels=(), symbol=None):
+        labels = tuple(sorted(labels))
+        identity = (name, labels)
+        with cls._lock:
+            key = cls._interned.get(identity)
+            if key is None:
+                key = cls(name, labels, symbol or formatSymbol(name, labels))
+                cls._interned[identity] = key
+        return key
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def labels(self):
+        return self._labels
+
+    @property
+    def symbol(self):
+        return self._symbol
+
+    def label(self, name, default=None):
+        for key, value in self._labels:
+            if key == name:
+                return value
+        return default
+
+    def withLabels(self, labels):
+        return Key.intern(self._name, self._labels + tuple(labels))
+
+    def without(self, names):
+        if names not in self._without:
+            labels = tuple((key, value) for key, value in self._labels if key not in names)
+            self._without[names] = self if labels == self._labels else Key.intern(self._name, labels)
+        return self._without[names]
+
+    def __repr__(self):
+        return self._symbol
@@ -0,0 +1,31 @@
+import time
+
+
+class Snapshot(object):
+    def __init__(self, samples, help=None, timestamp=None, wallclock=None, times=None):
+        self._timestamp = time.monotonic() if timestamp is None else timestamp
+        # timestamp is only good for intervals, outputs want the time of day the samples were taken
+        self._wallclock = time.time() if wallclock is None else wallclock
+        self._samples = samples
+        # when each sample was scraped, if not all of them are as fresh as timestamp
+        self._times = times
+        self._help = help or {}
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def wallclock(self):
+        return self._wallclock
+
+    @property
+    def samples(self):
+        return self._samples
+
+    @property
+    def times(self):
+        return self._times
+
+    def help(self, name):
+        return self._help.get(name, '')
@@ -0,0 +1,173 @@
+import numpy
+
+COUNTER_TYPES = ('counter', 'derive')
+_INITIAL_CAPACITY = 1024
+# weight of the newest rate in the moving mean and variance, about the last 1/alpha ticks matter
+DEFAULT_ALPHA = 0.1
+# ticks a row needs before its deviation is trusted
+_WARMUP = 5
+# a perfectly steady series is still allowed this much relative noise before it deviates
+_NOISE = 0.01
+
+
+def isCounter(type):
+    return type in COUNTER_TYPES
+
+
+class Store(object):
+    def __init__(self, depth, capacity=_INITIAL_CAPACITY, alpha=DEFAULT_ALPHA):
+        self._depth = max(depth, 2)
+        self._alpha = alpha
+        self._values = numpy.full((capacity, self._depth), numpy.nan)
+        self._counters = numpy.zeros(capacity, dtype=bool)
+        self._first = numpy.full(capacity, numpy.nan)
+        self._mean = numpy.full(capacity, numpy.nan)
+        self._variance = numpy.full(capacity, numpy.nan)
+        self._observations = numpy.zeros(capacity, dtype=numpy.intp)
+        self._deviations = numpy.full(capacity, numpy.nan)
+        self._times = numpy.full(self._depth, numpy.nan)
+        # when each value was scraped, a row can lag behind the tick it was written in
+        self._stamps = numpy.full((capacity, self._depth), numpy.nan)
+        self._column = self._depth - 1
+        self._ticks = 0
+        self._used = 0
+        self._free = []
+        self._rates = None
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def ticks(self):
+        return self._ticks
+
+    @property
+    def capacity(self):
+        return len(self._values)
+
+    def allocate(self, counter=False):
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._used == len(self._values):
+                self._grow()
+            row = self._used
+            self._used += 1
+        self._counters[row] = counter
+        return row
+
+    def release(self, row):
+        self._values[row] = numpy.nan
+        self._stamps[row] = numpy.nan
+        self._counters[row] = False
+        self._first[row] = numpy.nan
+        self._mean[row] = numpy.nan
+        self._variance[row] = numpy.nan
+        self._observations[row] = 0
+        self._deviations[row] = numpy.nan
+        self._free.append(row)
+
+    def _grow(self):
+        self._values = self._extend(self._values, numpy.nan)
+        self._stamps = self._extend(self._stamps, numpy.nan)
+        self._counters = self._extend(self._counters, False)
+        self._first = self._extend(self._first, numpy.nan)
+        self._mean = self._extend(self._mean, numpy.nan)
+        self._variance = self._extend(self._variance, numpy.nan)
+        self._observations = self._extend(self._observations, 0)
+        self._deviations = self._extend(self._deviations, numpy.nan)
+
+    def _extend(self, array, fill):
+        grown = numpy.full((len(array) * 2,) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def beginTick(self, timestamp):
+        self._settle()
+        self._column = (self._column + 1) % self._depth
+        self._values[:, self._column] = numpy.nan
+        self._stamps[:, self._column] = numpy.nan
+        self._times[self._column] = timestamp
+        self._ticks += 1
+        self._rates = None
+
+    def write(self, rows, values, times=None):
+        self._values[rows, self._column] = values
+        self._stamps[rows, self._column] = self._times[self._column] if times is None else times
+
+    def value(self, row, age=0):
+        return self._values[row, (self._column - age) % self._depth]
+
+    def current(self):
+        return self._values[:, self._column]
+
+    def endTick(self):
+        rates = self.rates()
+        observed = ~numpy.isnan(rates)
+        rows = numpy.flatnonzero(observed)
+        sample = rates[rows]
+        mean = self._mean[rows]
+        variance = self._variance[rows]
+        delta = sample - mean
+        # every sample is judged against the statistics from before it was seen
+        spread = numpy.sqrt(variance + (_NOISE * mean) ** 2)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            deviation = numpy.where(spread > 0, delta / spread, 0.0)
+        trusted = self._observations[rows] >= _WARMUP
+        self._deviations[:] = numpy.nan
+        self._deviations[rows[trusted]] = deviation[trusted]
+        fresh = numpy.isnan(mean)
+        self._mean[rows] = numpy.where(fresh, sample, mean + self._alpha * delta)
+        self._variance[rows] = numpy.where(fresh, 0.0, (1 - self._alpha) * (variance + self._alpha * delta * delta))
+        self._observations[rows] += 1
+
+    def means(self):
+        return self._mean
+
+    def deviations(self):
+        return self._deviations
+
+    def changes(self):
+        self._settle()
+        return self.current() - self._first
+
+    def _settle(self):
+        # remember the first value every row was seen with
+        unset = numpy.isnan(self._first)
+        self._first[unset] = self._values[unset, self._column]
+
+    def rates(self):
+        if self._rates is None:
+            self._rates = self._computeRates()
+        return self._rates
+
+    def _computeRates(self):
+        rates = numpy.full(len(self._values), numpy.nan)
+        rates[self._counters] = self.deltas(self._counters) / self.elapsed(self._counters)
+        return rates
+
+    def elapsed(self, rows=None):
+        if rows is None:
+            if self._ticks < 2:
+                return numpy.nan
+            previous = (self._column - 1) % self._depth
+            return self._times[self._column] - self._times[previous]
+        current = self._stamps[rows, self._column]
+        if self._ticks < 2:
+            return numpy.full(current.shape, numpy.nan)
+        previous = (self._column - 1) % self._depth
+        return current - self._stamps[rows, previous]
+
+    def deltas(self, rows):
+        current = self._values[rows, self._column]
+        if self._ticks < 2:
+            return numpy.full(current.shape, numpy.nan)
+        previous = (self._column - 1) % self._depth
+        delta = current - self._values[rows, previous]
+        # a counter that went backwards was reset and restarted from zero
+        reset = delta < 0
+        delta[reset] = current[reset]
+        # a value kept from an earlier scrape is not a new sample, the next one covers its interval
+        delta[~(self.elapsed(rows) > 0)] = numpy.nan
+        return delta
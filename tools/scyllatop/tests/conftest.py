@@ -0,0 +1,5 @@
+import os
+import sys
+
+# scyllatop is run as a script from its own directory, its modules import each other by their plain names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
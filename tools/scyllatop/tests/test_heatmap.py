@@ -0,0 +1,36 @@
+import cluster
+import exposition
+import fake
+import livedata
+import snapshot
+import views.heatmap
+
+NODES = (('10.0.0.1', 'dc1'), ('10.0.0.2', 'dc1'), ('10.1.0.1', 'dc2'), ('10.1.0.2', 'dc2'))
+SHARDS = 2
+TABLES = 3
+
+
+class _Cluster(object):
+    def __init__(self):
+        samples = []
+        for address, dc in NODES:
+            labels = ((cluster.INSTANCE, address), (cluster.DC, dc))
+            node = fake.Fake(fake.Generator(shards=SHARDS, families=1, tables=TABLES, histograms=0)).snapshot()
+            samples += [exposition.Sample(sample.key.withLabels(labels), sample.value, sample.type) for sample in node.samples]
+        self._snapshot = snapshot.Snapshot(samples)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def invalidate(self):
+        pass
+
+
+def test_two_dc_cluster_has_one_column_per_table():
+    liveData = livedata.LiveData(['*'], 1, _Cluster())
+    heatmap = views.heatmap.Heatmap(node=cluster.INSTANCE, over=(cluster.DC,))
+    heatmap._layout(liveData.measurements)
+    assert len(heatmap._columns) == TABLES
+    assert all(column.label(cluster.DC) is None for column in heatmap._columns)
+    assert len(heatmap._shards) == len(NODES) * SHARDS
+    assert (heatmap._index >= 0).all()
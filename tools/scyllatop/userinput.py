@@ -1,11 +1,16 @@
+import re
 import urwid
 import logging
 
+FILTER_KEY = '/'
+
 
 class UserInput(object):
     def __init__(self):
         self._viewMap = None
         self._mainLoop = None
+        self._prompt = None
+        self._prompted = None
 
     def setMap(self, ** viewMap):
         self._viewMap = viewMap
@@ -15,12 +20,44 @@ class UserInput(object):
 
     def __call__(self, keypress):
         logging.debug('keypress={}'.format(keypress))
+        if self._prompted is not None:
+            self._promptInput(keypress)
+            return
         if keypress in ('q', 'Q'):
             raise urwid.ExitMainLoop()
         if type(keypress) is not str:
             return
+        view = self._currentView()
+        if view is not None and view.keypress(keypress):
+            return
+        if keypress == FILTER_KEY and view is not None and view.filterable:
+            self._startPrompt(view)
+            return
         if keypress.upper() not in self._viewMap:
             return
 
         view = self._viewMap[keypress.upper()]
         self._mainLoop.widget = view.widget()
+
+    def _currentView(self):
+        for view in self._viewMap.values():
+            if view.widget() is self._mainLoop.widget:
+                return view
+
+    def _startPrompt(self, view):
+        self._prompt = urwid.Edit('filter (regex, enter to apply, esc to cancel): ', view.filter)
+        self._prompted = view
+        self._mainLoop.widget = urwid.Frame(view.widget(), footer=self._prompt, focus_part='footer')
+
+    def _promptInput(self, keypress):
+        if keypress == 'enter':
+            try:
+                self._prompted.setFilter(self._prompt.edit_text)
+            except re.error as error:
+                self._prompt.set_caption('invalid regex ({}), try again: '.format(error))
+                return
+        elif keypress != 'esc':
+            return
+        self._mainLoop.widget = self._prompted.widget()
+        self._prompted = None
+        self._prompt = None
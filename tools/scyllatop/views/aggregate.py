@@ -1,51 +1,63 @@
+import functools
 from . import groups
-from . import table
 from . import base
 from . import helpers
 
 
 class Aggregate(base.Base):
+    _UNIT = ''
+
+    def __init__(self, over=(groups.SHARD,)):
+        base.Base.__init__(self)
+        self._over = over
+        self._groups = None
+        self._labels = []
+        self._width = 0
+        self._generation = None
+
     def update(self, liveData):
         self.clearScreen()
-        self.writeStatusLine(liveData.measurements)
-        metricGroups = groups.Groups(liveData.measurements)
-        visible = metricGroups.all()
-        tableForm = self._prepareTable(visible)
-        for row in tableForm.rows():
-            self.writeLine(row)
+        self.writeStatusLine(liveData)
+        metricGroups = self._metricGroups(liveData)
+        reduction = metricGroups.reduce(self._vector(liveData))
+        self.writeRows(len(self._labels), functools.partial(self._formatRow, (metricGroups.all(), self._labels, self._width, reduction)))
 
         self.refresh()
 
-    def _prepareTable(self, groups):
-        result = table.Table('lr')
-        for group in groups:
-            formatted = 'avg[{0}] tot[{1}]'.format(
-                helpers.formatValues(group.aggregate(self._mean)),
-                helpers.formatValues(group.aggregate(self._sum)))
-            result.add(self._label(group), formatted)
-        return result
-
-    def _mean(self, values):
-        valid = self._valid(values)
-        if len(valid) == 0:
-            return 'not available'
-        return sum(x for x in valid) / len(valid)
-
-    def _sum(self, values):
-        valid = self._valid(values)
-        return sum(x for x in valid)
-
-    def _valid(self, values):
-        floats = [self._float(value) for value in values]
-        valid = [x for x in floats if x is not None]
-        return valid
-
-    def _float(self, value):
-        try:
-            return float(value)
-        except ValueError:
-            return None
+    def _metricGroups(self, liveData):
+        if self._generation != liveData.generation:
+            self._groups = groups.Groups(self._select(liveData.measurements), self._over)
+            self._labels = [self._label(group) for group in self._groups.all()]
+            self._width = max([len(label) for label in self._labels] + [0])
+            self._generation = liveData.generation
+        return self._groups
+
+    def _select(self, measurements):
+        return measurements
+
+    def _vector(self, liveData):
+        return liveData.store.current()
+
+    def _formatRow(self, state, i):
+        groupList, labels, width, reduction = state
+        if reduction.count[i] == 0:
+            formatted = 'not available'
+        elif groupList[i].size == 1:
+            formatted = self._number(reduction.total[i])
+        else:
+            formatted = 'avg[{0}] tot[{1}] min[{2}] max[{3}] p99[{4}]'.format(
+                self._number(reduction.mean[i]),
+                self._number(reduction.total[i]),
+                self._number(reduction.minimum[i]),
+                self._number(reduction.maximum[i]),
+                self._number(reduction.percentile[i]))
+        return '{} {}'.format(labels[i].ljust(width), formatted)
+
+    def _number(self, value):
+        return helpers.formatNumber(value, self._UNIT)
 
     def _label(self, group):
+        if group.size == 1:
+            return group.label
         label = '{label}({size})'.format(label=group.label, size=group.size)
         return label
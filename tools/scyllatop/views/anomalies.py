@@ -0,0 +1,57 @@
+import functools
+import numpy
+from . import base
+
+DEFAULT_SIGMA = 3.0
+_SIGMA_STEP = 0.5
+_VALUE_WIDTH = 14
+
+
+def _number(value):
+    if value != value:
+        return '-'
+    return '{0:.1f}'.format(value)
+
+
+class Anomalies(base.Base):
+    def __init__(self, sigma=DEFAULT_SIGMA):
+        base.Base.__init__(self)
+        self._sigma = sigma
+        self._metrics = []
+        self._storeRows = None
+        self._generation = None
+
+    def keypress(self, key):
+        if key not in ('+', '-'):
+            return False
+        self._sigma = max(_SIGMA_STEP, self._sigma + (_SIGMA_STEP if key == '+' else -_SIGMA_STEP))
+        return True
+
+    def update(self, liveData):
+        self.clearScreen()
+        self.writeStatusLine(liveData)
+        if self._generation != liveData.generation:
+            self._metrics = [metric for metric in liveData.measurements if metric.is_counter]
+            self._storeRows = numpy.array([metric.row for metric in self._metrics], dtype=numpy.intp)
+            self._generation = liveData.generation
+        store = liveData.store
+        deviations = store.deviations()[self._storeRows]
+        with numpy.errstate(invalid='ignore'):
+            found = numpy.flatnonzero(numpy.abs(deviations) > self._sigma)
+        found = found[numpy.argsort(-numpy.abs(deviations[found]), kind='stable')]
+        rows = self._storeRows[found]
+        metrics = [self._metrics[i] for i in found.tolist()]
+        width = max([len(metric.symbol) for metric in metrics] + [0])
+        self.writeLine('{0} of {1} counter rates deviate more than {2:g} sigma from their moving average | + - change the limit'.format(
+            len(metrics), len(self._metrics), self._sigma))
+        self.writeLine('{0} {1}{2}{3}'.format(''.ljust(width), 'rate'.rjust(_VALUE_WIDTH), 'average'.rjust(_VALUE_WIDTH), 'sigma'.rjust(_VALUE_WIDTH)))
+        self.writeRows(len(metrics), functools.partial(self._formatRow, (metrics, width, store.rates()[rows], store.means()[rows], deviations[found])))
+
+        self.refresh()
+
+    def _formatRow(self, state, position):
+        metrics, width, rates, means, deviations = state
+        return '{0} {1}{2}{3}'.format(metrics[position].symbol.ljust(width),
+                                      _number(rates[position]).rjust(_VALUE_WIDTH),
+                                      _number(means[position]).rjust(_VALUE_WIDTH),
+                                      '{:+.1f}'.format(deviations[position]).rjust(_VALUE_WIDTH))
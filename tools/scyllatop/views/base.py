@@ -1,31 +1,61 @@
 import time
 import urwid
+import instrumentation
+from . import walker
 
 
 class Base(object):
     def __init__(self):
         self._items = []
-        self._widgets = {}
-        self._box = urwid.ListBox(urwid.SimpleFocusListWalker([]))
+        self._rows = None
+        # what the screen shows, swapped as a whole because urwid formats the rows lazily on its own thread
+        self._state = ((), 0, None)
+        self._walker = walker.Walker(self._rowCount, self._row)
+        self._box = urwid.ListBox(self._walker)
 
     def widget(self):
         return self._box
 
-    def writeStatusLine(self, measurements):
-        line = '*** time: {0}| {1} measurements ***'.format(time.asctime(), len(measurements))
+    def keypress(self, key):
+        return False
+
+    @property
+    def filterable(self):
+        return False
+
+    def writeStatusLine(self, liveData):
+        line = '*** time: {0}| {1} measurements | scrape lag: {2:.2f}s | missed ticks: {3} ***'.format(
+            time.asctime(), len(liveData.measurements), liveData.lag, liveData.missed)
         self._items = [line]
+        timings = instrumentation.summary()
+        if timings is not None:
+            self._items.append('*** {} ***'.format(timings))
 
     def refresh(self):
-        for i, text in enumerate(self._items):
-            if i not in self._widgets:
-                self._widgets[i] = urwid.Button(text)
-                self._box.body.append(self._widgets[i])
-            else:
-                self._widgets[i].set_label(text)
+        count, row = self._rows or (0, None)
+        self._state = (tuple(self._items), count, row)
+        self._walker.refresh()
 
     def clearScreen(self):
         self._items = []
+        self._rows = None
         return
 
     def writeLine(self, thing):
         self._items.append(str(thing))
+
+    def writeRows(self, count, row):
+        self._rows = (count, row)
+
+    def _rowCount(self):
+        items, count, row = self._state
+        return len(items) + count
+
+    def _row(self, position):
+        items, count, row = self._state
+        if position < len(items):
+            return items[position]
+        if position - len(items) >= count:
+            # the state was swapped for a shorter one since the caller counted the rows
+            return ''
+        return row(position - len(items))
@@ -0,0 +1,153 @@
+import collections
+import numpy
+import series
+from . import groups
+
+HISTOGRAM = 'histogram'
+BUCKET_SUFFIX = '_bucket'
+LE = 'le'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def isBucket(metric):
+    key = metric.key
+    return metric.type == HISTOGRAM and key.name.endswith(BUCKET_SUFFIX) and key.label(LE) is not None
+
+
+def _bound(text):
+    try:
+        return float(text)
+    except ValueError:
+        return numpy.nan
+
+
+class Distribution(collections.namedtuple('Distribution', ['count', 'quantiles', 'maximum'])):
+    __slots__ = ()
+
+
+def distribution(cumulative, bounds, quantiles=QUANTILES):
+    count = cumulative[:, -1]
+    empty = ~(count > 0)
+    positions = numpy.arange(len(cumulative))
+    lastFinite = numpy.where(numpy.isinf(bounds), -numpy.inf, bounds).max(axis=1, initial=0)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        estimates = []
+        for quantile in quantiles:
+            estimates.append(_interpolate(cumulative, bounds, positions, quantile * count, lastFinite))
+        # the maximum is bounded by the first bucket holding every observation
+        top = _bucketOf(cumulative, count)
+        maximum = numpy.where(numpy.isinf(bounds[positions, top]), lastFinite, bounds[positions, top])
+    for estimate in estimates:
+        estimate[empty] = numpy.nan
+    maximum[empty] = numpy.nan
+    return Distribution(count, estimates, maximum)
+
+
+def _bucketOf(cumulative, target):
+    index = (cumulative < target[:, None]).sum(axis=1)
+    return numpy.minimum(index, cumulative.shape[1] - 1)
+
+
+def _interpolate(cumulative, bounds, positions, target, lastFinite):
+    index = _bucketOf(cumulative, target)
+    below = numpy.maximum(index - 1, 0)
+    first = index == 0
+    lower = numpy.where(first, 0.0, bounds[positions, below])
+    lowerCount = numpy.where(first, 0.0, cumulative[positions, below])
+    upper = bounds[positions, index]
+    inBucket = cumulative[positions, index] - lowerCount
+    fraction = numpy.where(inBucket > 0, (target - lowerCount) / inBucket, 1.0)
+    estimate = lower + fraction * (upper - lower)
+    # like Prometheus, anything past the last finite bound reports that bound
+    return numpy.where(numpy.isinf(upper), lastFinite, estimate)
+
+
+class Histogram(object):
+    def __init__(self, key, bounds):
+        self._key = key
+        self._bounds = bounds
+        self._members = []
+
+    def add(self, index):
+        self._members.append(index)
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def label(self):
+        return self._key.symbol
+
+    @property
+    def bounds(self):
+        return self._bounds
+
+    @property
+    def members(self):
+        return self._members
+
+    @property
+    def size(self):
+        return len(self._members)
+
+
+class Buckets(object):
+    def __init__(self, measurements, over=(groups.SHARD,)):
+        families = {}
+        for metric in measurements:
+            if not isBucket(metric):
+                continue
+            key = metric.key
+            labels = [label for label in key.labels if label[0] != LE]
+            family = series.Key.intern(key.name[:-len(BUCKET_SUFFIX)], labels)
+            families.setdefault(family, []).append((_bound(key.label(LE)), metric.row))
+        self._series = sorted(families, key=lambda key: key.symbol)
+        width = max([len(buckets) for buckets in families.values()] + [1])
+        self._rows = numpy.zeros((len(self._series), width), dtype=numpy.intp)
+        self._bounds = numpy.full((len(self._series), width), numpy.inf)
+        aggregates = {}
+        for i, key in enumerate(self._series):
+            buckets = sorted(families[key])
+            bounds = [bound for bound, row in buckets]
+            rows = [row for bound, row in buckets]
+            # pad with the last (+Inf) bucket so every row has the same width
+            self._rows[i] = rows + rows[-1:] * (width - len(rows))
+            self._bounds[i, :len(bounds)] = bounds
+            node = (key.without(over), tuple(bounds))
+            aggregate = aggregates.get(node)
+            if aggregate is None:
+                aggregate = aggregates[node] = Histogram(node[0], self._bounds[i])
+            aggregate.add(i)
+        self._aggregates = sorted(aggregates.values(), key=lambda histogram: histogram.label)
+        self._index = numpy.zeros(len(self._series), dtype=numpy.intp)
+        for i, aggregate in enumerate(self._aggregates):
+            self._index[aggregate.members] = i
+        self._aggregateBounds = numpy.array([aggregate.bounds for aggregate in self._aggregates]).reshape(len(self._aggregates), width)
+
+    @property
+    def series(self):
+        return self._series
+
+    @property
+    def aggregates(self):
+        return self._aggregates
+
+    def deltas(self, store):
+        cumulative = store.deltas(self._rows.ravel()).reshape(self._rows.shape)
+        # buckets are scraped independently and may disagree slightly, keep them monotonic
+        valid = ~numpy.isnan(cumulative).any(axis=1)
+        cumulative[valid] = numpy.maximum.accumulate(cumulative[valid], axis=1)
+        return cumulative
+
+    def rates(self, store):
+        # every series is divided by its own interval, a node that answered late covers more than one tick
+        return self.deltas(store) / store.elapsed(self._rows[:, 0])[:, None]
+
+    def distributions(self, store):
+        cumulative = self.rates(store)
+        perSeries = distribution(cumulative, self._bounds)
+        combined = numpy.zeros((len(self._aggregates), cumulative.shape[1]))
+        numpy.add.at(combined, self._index, numpy.nan_to_num(cumulative))
+        perAggregate = distribution(combined, self._aggregateBounds)
+        return perSeries, perAggregate
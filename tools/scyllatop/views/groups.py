@@ -1,12 +1,13 @@
-import re
-from . import mergeable
+import collections
+import numpy
 
+SHARD = 'shard'
+_PERCENTILE = 0.99
 
-class Group(object):
-    _HEAD_PATTERN = re.compile('^([^-]+)-\d+/')
 
-    def __init__(self, label):
-        self._label = label
+class Group(object):
+    def __init__(self, key):
+        self._key = key
         self._metrics = []
 
     def add(self, metric):
@@ -16,36 +17,72 @@ class Group(object):
     def metrics(self):
         return self._metrics
 
-    def aggregate(self, mergeMethod):
-        merger = mergeable.Mergeable(mergeMethod)
-        for metric in self._metrics:
-            merger.add(metric.status)
-
-        return merger.merged()
+    @property
+    def key(self):
+        return self._key
 
     @property
     def label(self):
-        return self._label
-
-    @classmethod
-    def extractLabel(cls, metric):
-        return cls._HEAD_PATTERN.sub(r'\1-*/', metric.symbol)
+        return self._key.symbol
 
     @property
     def size(self):
         return len(self._metrics)
 
 
+class Reduction(collections.namedtuple('Reduction', ['count', 'total', 'minimum', 'maximum', 'percentile'])):
+    __slots__ = ()
+
+    @property
+    def mean(self):
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return self.total / self.count
+
+
 class Groups(object):
-    def __init__(self, measurements):
+    def __init__(self, measurements, over=(SHARD,)):
+        self._over = tuple(over)
         self._groups = {}
         self._load(measurements)
+        self._sorted = sorted(self._groups.values(), key=lambda group: group.label)
+        rows = []
+        index = []
+        for i, group in enumerate(self._sorted):
+            for metric in group.metrics:
+                rows.append(metric.row)
+                index.append(i)
+        self._rows = numpy.array(rows, dtype=numpy.intp)
+        self._index = numpy.array(index, dtype=numpy.intp)
 
     def _load(self, measurements):
         for metric in measurements:
-            label = Group.extractLabel(metric)
-            self._groups.setdefault(label, Group(label))
-            self._groups[label].add(metric)
+            key = metric.key.without(self._over)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = Group(key)
+            group.add(metric)
 
     def all(self):
-        return sorted(list(self._groups.values()), key=lambda group: group.label)
+        return self._sorted
+
+    def reduce(self, vector):
+        size = len(self._sorted)
+        values = vector[self._rows]
+        valid = ~numpy.isnan(values)
+        index = self._index[valid]
+        values = values[valid]
+        count = numpy.bincount(index, minlength=size)
+        total = numpy.bincount(index, weights=values, minlength=size)
+        order = numpy.lexsort((values, index))
+        ordered = values[order]
+        first = numpy.searchsorted(index[order], numpy.arange(size))
+        present = count > 0
+        last = numpy.where(present, first + count - 1, 0)
+        rank = numpy.where(present, first + numpy.ceil(_PERCENTILE * count).astype(numpy.intp) - 1, 0)
+        minimum = numpy.full(size, numpy.nan)
+        maximum = numpy.full(size, numpy.nan)
+        percentile = numpy.full(size, numpy.nan)
+        minimum[present] = ordered[first[present]]
+        maximum[present] = ordered[last[present]]
+        percentile[present] = ordered[rank[present]]
+        return Reduction(count, total, minimum, maximum, percentile)
@@ -0,0 +1,153 @@
+import functools
+import warnings
+import numpy
+from . import groups
+from . import base
+
+_CELL_WIDTH = 8
+_OUTLIERS = 5
+# shards closer than this many deviations to their node median are never highlighted
+_MINIMUM_SCORE = 1.0
+_LEVELS = ('heat0', 'heat1', 'heat2', 'heat3', 'heat4', 'heat5')
+OUTLIER = 'outlier'
+PALETTE = [
+    ('heat0', 'light gray', 'default'),
+    ('heat1', 'white', 'dark blue'),
+    ('heat2', 'black', 'dark cyan'),
+    ('heat3', 'black', 'dark green'),
+    ('heat4', 'black', 'brown'),
+    ('heat5', 'white', 'dark red'),
+    (OUTLIER, 'light red,bold', 'default'),
+]
+
+
+def _compact(value):
+    if value != value:
+        return '-'
+    for divisor, suffix in ((1e9, 'G'), (1e6, 'M'), (1e3, 'k')):
+        if abs(value) >= divisor:
+            return '{0:.1f}{1}'.format(value / divisor, suffix)
+    return '{0:.1f}'.format(value)
+
+
+def _shardOrder(shard):
+    return (0, int(shard), '') if shard.isdigit() else (1, 0, shard)
+
+
+class Heatmap(base.Base):
+    def __init__(self, node=None, outliers=_OUTLIERS, over=()):
+        base.Base.__init__(self)
+        self._node = node
+        # labels, such as the data center of a node, which do not tell columns apart
+        self._over = tuple(over)
+        self._outliers = outliers
+        self._family = None
+        self._step = 0
+        self._families = []
+        self._columns = []
+        self._shards = []
+        self._labels = []
+        self._width = 0
+        self._index = None
+        self._nodes = []
+        self._generation = None
+
+    def keypress(self, key):
+        if key in ('[', ']'):
+            self._step += 1 if key == ']' else -1
+        elif key in ('+', '-'):
+            self._outliers = max(0, self._outliers + (1 if key == '+' else -1))
+        else:
+            return False
+        return True
+
+    def update(self, liveData):
+        self.clearScreen()
+        self.writeStatusLine(liveData)
+        if self._generation != liveData.generation or self._step:
+            self._layout(liveData.measurements)
+            self._generation = liveData.generation
+        self.writeLine('family: {0} ({1}/{2}) | [ ] change family | + - outliers: {3}'.format(
+            self._family, self._families.index(self._family) + 1 if self._family else 0, len(self._families), self._outliers))
+        for i, column in enumerate(self._columns):
+            self.writeLine('{0:>{1}}: {2}'.format(i + 1, _CELL_WIDTH - 2, column.symbol))
+        if self._columns:
+            self.writeLine(''.ljust(self._width + 2) + ''.join(str(i + 1).rjust(_CELL_WIDTH) for i in range(len(self._columns))))
+        values, levels, highlighted = self._compute(liveData.store.rates())
+        self.writeRows(len(self._shards), functools.partial(self._formatRow, (self._labels, self._width, values, levels, highlighted)))
+
+        self.refresh()
+
+    def _layout(self, measurements):
+        metrics = [metric for metric in measurements if metric.is_counter and metric.key.label(groups.SHARD) is not None]
+        self._families = sorted(set(metric.key.name for metric in metrics))
+        if not self._families:
+            self._family = None
+        elif self._family in self._families:
+            position = self._families.index(self._family) + self._step
+            self._family = self._families[position % len(self._families)]
+        else:
+            self._family = self._families[self._step % len(self._families)]
+        self._step = 0
+        over = (groups.SHARD,) + self._over if self._node is None else (groups.SHARD, self._node) + self._over
+        columns = {}
+        shards = {}
+        cells = []
+        for metric in metrics:
+            if metric.key.name != self._family:
+                continue
+            column = metric.key.without(over)
+            shard = (metric.key.label(self._node, '') if self._node else '', metric.key.label(groups.SHARD))
+            columns.setdefault(column, None)
+            shards.setdefault(shard, None)
+            cells.append((shard, column, metric.row))
+        self._columns = sorted(columns, key=lambda key: key.symbol)
+        self._shards = sorted(shards, key=lambda shard: (shard[0], _shardOrder(shard[1])))
+        columnIndex = dict((column, i) for i, column in enumerate(self._columns))
+        shardIndex = dict((shard, i) for i, shard in enumerate(self._shards))
+        self._index = numpy.full((len(self._shards), len(self._columns)), -1, dtype=numpy.intp)
+        for shard, column, row in cells:
+            self._index[shardIndex[shard], columnIndex[column]] = row
+        self._nodes = []
+        nodeNames = [node for node, shard in self._shards]
+        for node in sorted(set(nodeNames)):
+            self._nodes.append(numpy.array([i for i, name in enumerate(nodeNames) if name == node], dtype=numpy.intp))
+        self._labels = [' '.join(filter(None, (node, 'shard=' + shard))) for node, shard in self._shards]
+        self._width = max([len(label) for label in self._labels] + [0])
+
+    def _compute(self, rates):
+        values = rates[self._index]
+        values[self._index < 0] = numpy.nan
+        levels = numpy.zeros(values.shape, dtype=numpy.intp)
+        if values.size == 0:
+            return values, levels, set()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                peak = numpy.nanmax(values, axis=0)
+                scaled = numpy.nan_to_num(values / peak)
+                levels = numpy.clip(numpy.ceil(scaled * (len(_LEVELS) - 1)), 0, len(_LEVELS) - 1).astype(numpy.intp)
+                score = numpy.full(len(values), -numpy.inf)
+                for rows in self._nodes:
+                    shards = values[rows]
+                    median = numpy.nanmedian(shards, axis=0)
+                    spread = numpy.nanstd(shards, axis=0)
+                    deviation = numpy.abs(shards - median) / spread
+                    score[rows] = numpy.nanmax(numpy.where(spread > 0, deviation, 0), axis=1)
+        score = numpy.nan_to_num(score, nan=-numpy.inf)
+        count = min(self._outliers, len(score))
+        if count == 0:
+            return values, levels, set()
+        top = numpy.argpartition(-score, count - 1)[:count]
+        return values, levels, set(int(i) for i in top if score[i] >= _MINIMUM_SCORE)
+
+    def _formatRow(self, state, i):
+        labels, width, values, levels, highlighted = state
+        label = labels[i].ljust(width)
+        if i in highlighted:
+            markup = [(OUTLIER, '* ' + label)]
+        else:
+            markup = ['  ' + label]
+        for value, level in zip(values[i], levels[i]):
+            markup.append((_LEVELS[level], _compact(value).rjust(_CELL_WIDTH)))
+        return markup
@@ -14,3 +14,9 @@ def formatValues(status):
         values.append('{key}: {value}'.format(key=key, value=_safeFormat(value)))
 
     return ' '.join(values)
+
+
+def formatNumber(value, suffix=''):
+    if value != value:
+        return 'not available'
+    return '{value:.1f}{suffix}'.format(value=value, suffix=suffix)
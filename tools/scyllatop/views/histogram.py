@@ -0,0 +1,66 @@
+import functools
+from . import buckets
+from . import groups
+from . import base
+from . import helpers
+
+
+class Histogram(base.Base):
+    def __init__(self, over=(groups.SHARD,)):
+        base.Base.__init__(self)
+        self._over = over
+        self._buckets = None
+        self._lines = []
+        self._labels = {}
+        self._width = 0
+        self._generation = None
+
+    def update(self, liveData):
+        self.clearScreen()
+        self.writeStatusLine(liveData)
+        histograms = self._histograms(liveData)
+        perSeries, perAggregate = histograms.distributions(liveData.store)
+        self.writeRows(len(self._lines), functools.partial(self._formatRow, (self._lines, self._labels, self._width, perSeries, perAggregate)))
+
+        self.refresh()
+
+    def _histograms(self, liveData):
+        if self._generation != liveData.generation:
+            self._buckets = buckets.Buckets(liveData.measurements, self._over)
+            self._layout()
+            self._generation = liveData.generation
+        return self._buckets
+
+    def _layout(self):
+        self._lines = []
+        self._labels = {}
+        series = self._buckets.series
+        for i, aggregate in enumerate(self._buckets.aggregates):
+            self._lines.append((True, i))
+            self._labels[True, i] = '{label}({size})'.format(label=aggregate.label, size=aggregate.size)
+            if aggregate.size == 1:
+                continue
+            for member in aggregate.members:
+                self._lines.append((False, member))
+                self._labels[False, member] = '  ' + self._memberLabel(series[member], aggregate)
+        self._width = max([len(label) for label in self._labels.values()] + [0])
+
+    def _memberLabel(self, key, aggregate):
+        names = set(name for name, value in aggregate.key.labels)
+        return ','.join('{}={}'.format(name, value) for name, value in key.labels if name not in names)
+
+    def _formatRow(self, state, i):
+        lines, labels, width, perSeries, perAggregate = state
+        line = lines[i]
+        aggregate, index = line
+        distribution = perAggregate if aggregate else perSeries
+        count = distribution.count[index]
+        if not count > 0:
+            formatted = 'not available'
+        else:
+            quantiles = ' '.join('p{0:g}[{1}]'.format(quantile * 100, helpers.formatNumber(estimate[index]))
+                                 for quantile, estimate in zip(buckets.QUANTILES, distribution.quantiles))
+            formatted = '{0} max[{1}] rate[{2}]'.format(quantiles,
+                                                        helpers.formatNumber(distribution.maximum[index]),
+                                                        helpers.formatNumber(count, '/s'))
+        return '{} {}'.format(labels[line].ljust(width), formatted)
@@ -0,0 +1,11 @@
+from . import aggregate
+
+
+class Rate(aggregate.Aggregate):
+    _UNIT = '/s'
+
+    def _select(self, measurements):
+        return [metric for metric in measurements if metric.is_counter]
+
+    def _vector(self, liveData):
+        return liveData.store.rates()
@@ -1,19 +1,34 @@
+import functools
+import numpy
 from . import base
 from . import helpers
-from . import table
+
+_VALUE_WIDTH = 16
 
 
 class Simple(base.Base):
+    def __init__(self):
+        base.Base.__init__(self)
+        self._metrics = []
+        self._storeRows = None
+        self._width = 0
+        self._generation = None
+
     def update(self, liveData):
         self.clearScreen()
-        self.writeStatusLine(liveData.measurements)
-        tableForm = self._prepareTable(liveData.measurements)
-        for row in tableForm.rows():
-            self.writeLine(row)
+        self.writeStatusLine(liveData)
+        if self._generation != liveData.generation:
+            self._metrics = list(liveData.measurements)
+            self._storeRows = numpy.array([metric.row for metric in self._metrics], dtype=numpy.intp)
+            self._width = max([len(metric.symbol) for metric in self._metrics] + [0])
+            self._generation = liveData.generation
+        values = liveData.store.current()[self._storeRows]
+        absent = [i for i, metric in enumerate(self._metrics) if metric.is_absent]
+        values[absent] = numpy.nan
+        self.writeRows(len(self._metrics), functools.partial(self._formatRow, (self._metrics, self._width, values)))
         self.refresh()
 
-    def _prepareTable(self, measurements):
-        result = table.Table('lr')
-        for metric in measurements:
-            result.add(metric.symbol, helpers.formatValues(metric.status))
-        return result
+    def _formatRow(self, state, position):
+        metrics, width, values = state
+        return '{} {}'.format(metrics[position].symbol.ljust(width),
+                              helpers.formatNumber(values[position]).rjust(_VALUE_WIDTH))
@@ -0,0 +1,96 @@
+import functools
+import re
+import numpy
+from . import base
+
+RATE = 'rate'
+VALUE = 'value'
+CHANGE = 'change'
+SORT_KEYS = (RATE, VALUE, CHANGE)
+_SIZE = 100
+_VALUE_WIDTH = 14
+
+
+def largest(vector, count):
+    keys = numpy.where(numpy.isnan(vector), -numpy.inf, vector)
+    if count < len(keys):
+        candidates = numpy.argpartition(-keys, count - 1)[:count]
+    else:
+        candidates = numpy.arange(len(keys))
+    return candidates[numpy.argsort(-keys[candidates], kind='stable')]
+
+
+def _number(value):
+    if value != value:
+        return '-'
+    return '{0:.1f}'.format(value)
+
+
+class Top(base.Base):
+    def __init__(self, size=_SIZE, sortKey=RATE):
+        base.Base.__init__(self)
+        self._size = size
+        self._sortKey = sortKey
+        self._filter = None
+        self._metrics = []
+        self._storeRows = None
+        self._selected = None
+        self._generation = None
+
+    @property
+    def filterable(self):
+        return True
+
+    @property
+    def filter(self):
+        return self._filter.pattern if self._filter else ''
+
+    def setFilter(self, pattern):
+        self._filter = re.compile(pattern) if pattern else None
+        self._selected = None
+
+    def keypress(self, key):
+        if key not in ('1', '2', '3'):
+            return False
+        self._sortKey = SORT_KEYS[int(key) - 1]
+        return True
+
+    def update(self, liveData):
+        self.clearScreen()
+        self.writeStatusLine(liveData)
+        if self._generation != liveData.generation:
+            self._metrics = list(liveData.measurements)
+            self._storeRows = numpy.array([metric.row for metric in self._metrics], dtype=numpy.intp)
+            self._selected = None
+            self._generation = liveData.generation
+        selected = self._selected
+        if selected is None:
+            selected = self._selected = self._select()
+        store = liveData.store
+        rows = self._storeRows[selected]
+        rates = store.rates()[rows]
+        values = store.current()[rows]
+        changes = store.changes()[rows]
+        vector = {RATE: rates, VALUE: values, CHANGE: numpy.abs(changes)}[self._sortKey]
+        order = largest(vector, self._size)
+        metrics = [self._metrics[i] for i in selected[order]]
+        width = max([len(metric.symbol) for metric in metrics] + [0])
+        self.writeLine('top {0} of {1} by {2} | 1 - rate, 2 - value, 3 - change since start | / - filter: {3}'.format(
+            len(order), len(selected), self._sortKey, self.filter or 'none'))
+        self.writeLine('{0} {1}{2}{3}'.format(''.ljust(width), RATE.rjust(_VALUE_WIDTH), VALUE.rjust(_VALUE_WIDTH), CHANGE.rjust(_VALUE_WIDTH)))
+        self.writeRows(len(metrics), functools.partial(self._formatRow, (metrics, width, rates[order], values[order], changes[order])))
+
+        self.refresh()
+
+    def _select(self):
+        if self._filter is None:
+            return numpy.arange(len(self._metrics), dtype=numpy.intp)
+        search = self._filter.search
+        return numpy.array([i for i, metric in enumerate(self._metrics) if search(metric.symbol)], dtype=numpy.intp)
+
+    def _formatRow(self, state, position):
+        metrics, width, rates, values, changes = state
+        return '{0} {1}{2}{3}'.format(metrics[position].symbol.ljust(width),
+                                      _number(rates[position]).rjust(_VALUE_WIDTH),
+                                      _number(values[position]).rjust(_VALUE_WIDTH),
+                                      _number(changes[position]).rjust(_VALUE_WIDTH))
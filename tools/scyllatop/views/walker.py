@@ -0,0 +1,79 @@
+import urwid
+
+# rows this far from the focus lose their cached widget on the next refresh
+_KEEP_DISTANCE = 256
+
+
+class Walker(urwid.ListWalker):
+    def __init__(self, rowCount, row):
+        self._rowCount = rowCount
+        self._row = row
+        self._widgets = {}
+        self.focus = 0
+
+    def _widget(self, position):
+        if position < 0 or position >= self._rowCount():
+            return None
+        cached = self._widgets.get(position)
+        if cached is None:
+            row = self._row(position)
+            cached = self._widgets[position] = (urwid.Button(row), row)
+        return cached[0]
+
+    def get_focus(self):
+        widget = self._widget(self.focus)
+        if widget is None:
+            return None, None
+        return widget, self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        widget = self._widget(position + 1)
+        if widget is None:
+            return None, None
+        return widget, position + 1
+
+    def get_prev(self, position):
+        widget = self._widget(position - 1)
+        if widget is None:
+            return None, None
+        return widget, position - 1
+
+    def next_position(self, position):
+        if position + 1 >= self._rowCount():
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(self._rowCount() - 1, -1, -1)
+        return range(self._rowCount())
+
+    def __getitem__(self, position):
+        widget = self._widget(position)
+        if widget is None:
+            raise IndexError(position)
+        return widget
+
+    def refresh(self):
+        count = self._rowCount()
+        self.focus = max(0, min(self.focus, count - 1))
+        for position in list(self._widgets):
+            if position >= count or abs(position - self.focus) > _KEEP_DISTANCE:
+                del self._widgets[position]
+                continue
+            # rows may be markup, compare with what was rendered rather than the label text
+            widget, rendered = self._widgets[position]
+            row = self._row(position)
+            if row != rendered:
+                widget.set_label(row)
+                self._widgets[position] = (widget, row)
+        self._modified()
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import logging
+import re
+import sys
+import numpy
+import series
+from . import groups
+
+_STATISTICS = ('avg', 'tot', 'min', 'max', 'p99')
+_INVALID_NAME_CHARACTERS = re.compile('[^a-zA-Z0-9_:]')
+
+
+def _name(key, suffix):
+    return series.formatSymbol(key.name + suffix, key.labels)
+
+
+def _statistics(reduction):
+    total = numpy.where(reduction.count > 0, reduction.total, numpy.nan)
+    return [reduction.mean, total, reduction.minimum, reduction.maximum, reduction.percentile]
+
+
+def _promSymbol(symbol):
+    name, brace, labels = symbol.partition('{')
+    name = _INVALID_NAME_CHARACTERS.sub('_', name)
+    if name[:1].isdigit():
+        name = '_' + name
+    return name + brace + labels
+
+
+class Writer(object):
+    def __init__(self, stream=None, rates=False, aggregates=False):
+        self._stream = stream if stream is not None else sys.stdout
+        self._rates = rates
+        self._aggregates = aggregates
+        self._names = []
+        self._valueRows = None
+        self._valueGroups = None
+        self._rateRows = None
+        self._rateGroups = None
+        self._generation = None
+
+    def update(self, liveData):
+        logging.debug('{}: {} measurements'.format(self.__class__.__name__, len(liveData.measurements)))
+        if self._generation != liveData.generation:
+            self._layout(liveData.measurements)
+            self._generation = liveData.generation
+            self._stream.write(self._header())
+        store = liveData.store
+        current = store.current()
+        vectors = [current[self._valueRows]]
+        if self._aggregates:
+            vectors += _statistics(self._valueGroups.reduce(current))
+        if self._rates:
+            rates = store.rates()
+            vectors.append(rates[self._rateRows])
+            if self._aggregates:
+                vectors += _statistics(self._rateGroups.reduce(rates))
+        self._stream.write(self._record(liveData.wallclock, numpy.concatenate(vectors)))
+        self._stream.flush()
+
+    def _layout(self, measurements):
+        metrics = list(measurements)
+        self._names = [metric.symbol for metric in metrics]
+        self._valueRows = numpy.array([metric.row for metric in metrics], dtype=numpy.intp)
+        if self._aggregates:
+            self._valueGroups = groups.Groups(metrics)
+            self._names += self._groupNames(self._valueGroups, '')
+        if self._rates:
+            counters = [metric for metric in metrics if metric.is_counter]
+            self._names += [_name(metric.key, ':rate') for metric in counters]
+            self._rateRows = numpy.array([metric.row for metric in counters], dtype=numpy.intp)
+            if self._aggregates:
+                self._rateGroups = groups.Groups(counters)
+                self._names += self._groupNames(self._rateGroups, ':rate')
+        self._prepare(self._names)
+
+    def _groupNames(self, metricGroups, suffix):
+        return [_name(group.key, '{}:{}'.format(suffix, statistic)) for statistic in _STATISTICS for group in metricGroups.all()]
+
+    def _values(self, values):
+        text = list(map(repr, values.tolist()))
+        for i in numpy.flatnonzero(~numpy.isfinite(values)).tolist():
+            text[i] = None
+        return text
+
+    def _prepare(self, names):
+        pass
+
+    def _header(self):
+        return ''
+
+
+class Text(Writer):
+    def _prepare(self, names):
+        self._prefixes = [name + ' ' for name in names]
+
+    def _record(self, timestamp, values):
+        lines = ['{}{:.1f}\n'.format(prefix, value) if value == value else prefix + 'not available\n'
+                 for prefix, value in zip(self._prefixes, values.tolist())]
+        return ''.join(lines)
+
+
+class JsonLines(Writer):
+    def _prepare(self, names):
+        self._keys = [json.dumps(name) + ':' for name in names]
+
+    def _record(self, timestamp, values):
+        fields = ','.join(key + ('null' if value is None else value) for key, value in zip(self._keys, self._values(values)))
+        return '{{"timestamp":{:.3f},"values":{{{}}}}}\n'.format(timestamp, fields)
+
+
+class Csv(Writer):
+    def __init__(self, *args, **kwargs):
+        Writer.__init__(self, *args, **kwargs)
+        self._columns = None
+        self._headerWritten = False
+        self._take = None
+
+    def _prepare(self, names):
+        # the columns are the series of the first tick: series which expire are written empty,
+        # series which appear later are left out so that the file keeps a single header
+        if self._columns is None:
+            self._columns = list(names)
+        positions = dict((name, i) for i, name in enumerate(names))
+        self._take = numpy.array([positions.get(column, len(names)) for column in self._columns], dtype=numpy.intp)
+        left = len(set(names) - set(self._columns))
+        if left:
+            logging.warning('csv: {} series appeared after the header was written and are left out'.format(left))
+
+    def _header(self):
+        if self._headerWritten:
+            return ''
+        self._headerWritten = True
+        header = io.StringIO()
+        csv.writer(header, lineterminator='\n').writerow(['timestamp'] + self._columns)
+        return header.getvalue()
+
+    def _record(self, timestamp, values):
+        values = numpy.append(values, numpy.nan)[self._take]
+        fields = ','.join('' if value is None else value for value in self._values(values))
+        return '{:.3f},{}\n'.format(timestamp, fields)
+
+
+class Prom(Writer):
+    def _prepare(self, names):
+        # collectd identifiers (host/cpu-0/cpu-user) are not valid metric names
+        self._prefixes = [_promSymbol(name) + ' ' for name in names]
+
+    def _record(self, timestamp, values):
+        suffix = ' {}\n'.format(int(timestamp * 1000))
+        lines = [prefix + value + suffix for prefix, value in zip(self._prefixes, self._values(values)) if value is not None]
+        return ''.join(lines)
+
+
+FORMATS = dict(text=Text, jsonl=JsonLines, csv=Csv, prom=Prom)